@@ -5,7 +5,7 @@
 PyFBB - Pure Python F6FBB packet radio BBS forwarding library
 """
 
-from .fbb.forwarder import FBBForwarder, FBBProtocolError
+from .fbb.forwarder import FBBForwarder, FBBProtocolError, configure_logging
 from .fbb.lzhuf import LZHUF_Comp
 from .fbb.transport import (
     KISSTransport,
@@ -20,6 +20,7 @@ __author__ = "Kris Kirby, KE4AHR"
 __all__ = [
     "FBBForwarder",
     "FBBProtocolError",
+    "configure_logging",
     "LZHUF_Comp",
     "KISSTransport",
     "AX25Connection",
@@ -6,7 +6,7 @@
 Internal fbb package.
 """
 
-from .forwarder import FBBForwarder, FBBProtocolError
+from .forwarder import FBBForwarder, FBBProtocolError, configure_logging
 from .lzhuf import LZHUF_Comp
 from .transport import (
     KISSTransport,
@@ -18,6 +18,7 @@ from .transport import (
 __all__ = [
     "FBBForwarder",
     "FBBProtocolError",
+    "configure_logging",
     "LZHUF_Comp",
     "KISSTransport",
     "AX25Connection",
@@ -0,0 +1,423 @@
+# pyfbb/fbb/_lzhuf.pyx
+# Copyright (C) 2025-2026 Kris Kirby, KE4AHR
+# SPDX-License-Identifier: LGPL-3.0-or-later
+# cython: language_level=3, boundscheck=False, wraparound=False, cdivision=True
+
+"""
+Optional compiled LZHUF codec; lzhuf.LZHUF_Comp uses it when built.
+
+Produces exactly the same stream as the pure-Python implementation:
+4-byte little-endian original length followed by the LZSS + adaptive
+Huffman bitstream.
+"""
+
+from libc.string cimport memmove, memset
+
+cdef enum:
+    N = 4096                    # size of ring buffer
+    F = 60                      # upper limit for match_length
+    THRESHOLD = 2
+    N_CHAR = 256 - THRESHOLD + F
+    T = N_CHAR * 2 - 1          # size of table
+    R = T - 1                   # position of root
+    MAX_FREQ = 0x8000
+    NIL = N                     # end of tree marker
+    MAX_EXPANSION = 8 * F // 10 # output bytes per input byte; see LZHUF_Comp
+
+cdef unsigned char p_len[64]
+cdef unsigned char p_code[64]
+cdef unsigned char d_code[256]
+cdef unsigned char d_len[256]
+
+cdef struct State:
+    unsigned char text_buf[N + F - 1]
+    int lson[N + 1]
+    int rson[N + 257]
+    int dad[N + 1]
+    unsigned int freq[T + 1]
+    int prnt[T + N_CHAR]
+    int son[T]
+    int match_position
+    int match_length
+
+
+cdef void _init_tables() noexcept:
+    cdef int i, j, k, n
+    cdef int plens[6]
+    cdef int pcounts[6]
+    plens[:] = [3, 4, 5, 6, 7, 8]
+    pcounts[:] = [1, 3, 8, 12, 24, 16]
+    # p_code/p_len: codes of increasing length for the upper 6 position bits;
+    # d_code/d_len: the inverse, indexed by the next 8 input bits
+    k = 0
+    n = 0
+    for i in range(6):
+        for j in range(pcounts[i]):
+            p_len[k] = plens[i]
+            p_code[k] = n >> 8
+            n += 1 << (16 - plens[i])
+            k += 1
+    for k in range(64):
+        for j in range(1 << (8 - p_len[k])):
+            d_code[p_code[k] + j] = k
+            d_len[p_code[k] + j] = p_len[k]
+
+_init_tables()
+
+
+cdef void start_huff(State *st) noexcept nogil:
+    cdef int i, j
+    for i in range(N_CHAR):
+        st.freq[i] = 1
+        st.son[i] = i + T
+        st.prnt[i + T] = i
+    i = 0
+    j = N_CHAR
+    while j <= R:
+        st.freq[j] = st.freq[i] + st.freq[i + 1]
+        st.son[j] = i
+        st.prnt[i] = j
+        st.prnt[i + 1] = j
+        i += 2
+        j += 1
+    st.freq[T] = 0xffff
+    st.prnt[R] = 0
+
+
+cdef void reconst(State *st) noexcept nogil:
+    cdef int i, j, k
+    cdef unsigned int f
+    j = 0
+    for i in range(T):
+        if st.son[i] >= T:
+            st.freq[j] = (st.freq[i] + 1) // 2
+            st.son[j] = st.son[i]
+            j += 1
+    i = 0
+    for j in range(N_CHAR, T):
+        f = st.freq[i] + st.freq[i + 1]
+        st.freq[j] = f
+        k = j - 1
+        while f < st.freq[k]:
+            k -= 1
+        k += 1
+        memmove(&st.freq[k + 1], &st.freq[k], (j - k) * sizeof(unsigned int))
+        st.freq[k] = f
+        memmove(&st.son[k + 1], &st.son[k], (j - k) * sizeof(int))
+        st.son[k] = i
+        i += 2
+    for i in range(T):
+        k = st.son[i]
+        st.prnt[k] = i
+        if k < T:
+            st.prnt[k + 1] = i
+
+
+cdef void update(State *st, int c) noexcept nogil:
+    cdef int i, j, l
+    cdef unsigned int k
+    if st.freq[R] == MAX_FREQ:
+        reconst(st)
+    c = st.prnt[c + T]
+    while True:
+        st.freq[c] += 1
+        k = st.freq[c]
+        l = c + 1
+        if k > st.freq[l]:
+            l += 1
+            while k > st.freq[l]:
+                l += 1
+            l -= 1
+            st.freq[c] = st.freq[l]
+            st.freq[l] = k
+            i = st.son[c]
+            st.prnt[i] = l
+            if i < T:
+                st.prnt[i + 1] = l
+            j = st.son[l]
+            st.son[l] = i
+            st.prnt[j] = c
+            if j < T:
+                st.prnt[j + 1] = c
+            st.son[c] = j
+            c = l
+        c = st.prnt[c]
+        if c == 0:
+            break
+
+
+cdef void init_tree(State *st) noexcept nogil:
+    cdef int i
+    for i in range(N + 1, N + 257):
+        st.rson[i] = NIL
+    for i in range(N):
+        st.dad[i] = NIL
+
+
+cdef void insert_node(State *st, int r) noexcept nogil:
+    cdef int i, p, cmp, c
+    cdef unsigned char *key = &st.text_buf[r]
+    cmp = 1
+    p = N + 1 + key[0]
+    st.rson[r] = NIL
+    st.lson[r] = NIL
+    st.match_length = 0
+    while True:
+        if cmp >= 0:
+            if st.rson[p] != NIL:
+                p = st.rson[p]
+            else:
+                st.rson[p] = r
+                st.dad[r] = p
+                return
+        else:
+            if st.lson[p] != NIL:
+                p = st.lson[p]
+            else:
+                st.lson[p] = r
+                st.dad[r] = p
+                return
+        i = 1
+        while i < F:
+            cmp = key[i] - st.text_buf[p + i]
+            if cmp != 0:
+                break
+            i += 1
+        if i > st.match_length:
+            st.match_position = ((r - p) & (N - 1)) - 1
+            st.match_length = i
+            if i >= F:
+                break
+        elif i == st.match_length:
+            c = ((r - p) & (N - 1)) - 1
+            if c < st.match_position:
+                st.match_position = c
+    st.dad[r] = st.dad[p]
+    st.lson[r] = st.lson[p]
+    st.rson[r] = st.rson[p]
+    st.dad[st.lson[p]] = r
+    st.dad[st.rson[p]] = r
+    if st.rson[st.dad[p]] == p:
+        st.rson[st.dad[p]] = r
+    else:
+        st.lson[st.dad[p]] = r
+    st.dad[p] = NIL
+
+
+cdef void delete_node(State *st, int p) noexcept nogil:
+    cdef int q
+    if st.dad[p] == NIL:
+        return
+    if st.rson[p] == NIL:
+        q = st.lson[p]
+    elif st.lson[p] == NIL:
+        q = st.rson[p]
+    else:
+        q = st.lson[p]
+        if st.rson[q] != NIL:
+            while st.rson[q] != NIL:
+                q = st.rson[q]
+            st.rson[st.dad[q]] = st.lson[q]
+            st.dad[st.lson[q]] = st.dad[q]
+            st.lson[q] = st.lson[p]
+            st.dad[st.lson[p]] = q
+        st.rson[q] = st.rson[p]
+        st.dad[st.rson[p]] = q
+    st.dad[q] = st.dad[p]
+    if st.rson[st.dad[p]] == p:
+        st.rson[st.dad[p]] = q
+    else:
+        st.lson[st.dad[p]] = q
+    st.dad[p] = NIL
+
+
+cdef class _BitWriter:
+    cdef bytearray out
+    cdef unsigned long long reg
+    cdef int count
+
+    def __cinit__(self, bytearray out):
+        self.out = out
+        self.reg = 0
+        self.count = 0
+
+    cdef inline void put(self, int l, unsigned int c):
+        # c carries its code in the top l of 16 bits
+        self.reg = (self.reg << l) | (c >> (16 - l))
+        self.count += l
+        while self.count >= 8:
+            self.count -= 8
+            self.out.append(<unsigned char>(self.reg >> self.count))
+
+    cdef void end(self):
+        if self.count:
+            self.out.append(<unsigned char>(self.reg << (8 - self.count)))
+            self.count = 0
+
+
+cdef void encode_char(State *st, _BitWriter w, int c):
+    cdef unsigned int code = 0
+    cdef int j = 0
+    cdef int k = st.prnt[c + T]
+    while k != R:
+        code >>= 1
+        if k & 1:
+            code += 0x8000
+        j += 1
+        k = st.prnt[k]
+    w.put(j, code)
+    update(st, c)
+
+
+def encode(const unsigned char[:] data):
+    """
+    Compress bytes with LZHUF.
+
+    :param data: Input bytes
+    :return: Compressed bytes
+    """
+    cdef Py_ssize_t textsize = data.shape[0]
+    cdef Py_ssize_t text_pos
+    cdef int i, c, length, r, s, last_match_length
+    cdef State st
+    cdef bytearray out = bytearray((<unsigned int>textsize).to_bytes(4, 'little'))
+    cdef _BitWriter w = _BitWriter(out)
+
+    if textsize == 0:
+        return bytes(out)
+
+    start_huff(&st)
+    init_tree(&st)
+    s = 0
+    r = N - F
+    memset(st.text_buf, 0x20, r)
+    length = 0
+    while length < F and length < textsize:
+        st.text_buf[r + length] = data[length]
+        length += 1
+    text_pos = length
+
+    for i in range(1, F + 1):
+        insert_node(&st, r - i)
+    insert_node(&st, r)
+
+    while length > 0:
+        if st.match_length > length:
+            st.match_length = length
+        if st.match_length <= THRESHOLD:
+            st.match_length = 1
+            encode_char(&st, w, st.text_buf[r])
+        else:
+            encode_char(&st, w, 255 - THRESHOLD + st.match_length)
+            i = st.match_position >> 6
+            w.put(p_len[i], <unsigned int>p_code[i] << 8)
+            w.put(6, (st.match_position & 0x3f) << 10)
+        last_match_length = st.match_length
+        i = 0
+        while i < last_match_length and text_pos < textsize:
+            c = data[text_pos]
+            text_pos += 1
+            delete_node(&st, s)
+            st.text_buf[s] = c
+            if s < F - 1:
+                st.text_buf[s + N] = c
+            s = (s + 1) & (N - 1)
+            r = (r + 1) & (N - 1)
+            insert_node(&st, r)
+            i += 1
+        while i < last_match_length:
+            i += 1
+            delete_node(&st, s)
+            s = (s + 1) & (N - 1)
+            r = (r + 1) & (N - 1)
+            length -= 1
+            if length:
+                insert_node(&st, r)
+
+    w.end()
+    return bytes(out)
+
+
+def decode(const unsigned char[:] code, max_size=None):
+    """
+    Decompress an LZHUF stream.
+
+    :param code: Compressed input, starting with the 4-byte original length
+    :param max_size: Largest original length to accept (None = no limit)
+    :return: Original bytes
+    :raises ValueError: Length header too large, or input exhausted early
+    """
+    cdef Py_ssize_t codesize = code.shape[0]
+    cdef Py_ssize_t pos = 4
+    cdef Py_ssize_t count = 0
+    cdef Py_ssize_t textsize
+    cdef unsigned int getbuf = 0
+    cdef int getlen = 0
+    cdef int c, i, j, k, r
+    cdef State st
+    cdef bytearray out
+    cdef unsigned char *dst
+
+    if codesize < 4:
+        return b''
+    textsize = code[0] | (code[1] << 8) | (code[2] << 16) | (<Py_ssize_t>code[3] << 24)
+    # Size the output buffer only from a header that passed the limits
+    if max_size is not None and textsize > max_size:
+        raise ValueError(f"LZHUF length {textsize} exceeds limit {max_size}")
+    if textsize > (codesize - 4) * MAX_EXPANSION:
+        raise ValueError(f"LZHUF length {textsize} too large for {codesize} input bytes")
+    out = bytearray(textsize)
+    dst = out
+
+    start_huff(&st)
+    r = N - F
+    memset(st.text_buf, 0x20, r)
+
+    while count < textsize:
+        # Keep at least 16 bits buffered; past the end of input reads zeros
+        while getlen <= 16:
+            getbuf |= (code[pos] if pos < codesize else 0) << (24 - getlen)
+            pos += 1
+            getlen += 8
+        c = st.son[R]
+        while c < T:
+            if getlen <= 8:
+                getbuf |= (code[pos] if pos < codesize else 0) << (24 - getlen)
+                pos += 1
+                getlen += 8
+            c = st.son[c + (getbuf >> 31)]
+            getbuf <<= 1
+            getlen -= 1
+        c -= T
+        update(&st, c)
+        if c < 256:
+            dst[count] = c
+            count += 1
+            st.text_buf[r] = c
+            r = (r + 1) & (N - 1)
+        else:
+            while getlen <= 16:
+                getbuf |= (code[pos] if pos < codesize else 0) << (24 - getlen)
+                pos += 1
+                getlen += 8
+            i = getbuf >> 24
+            getbuf <<= 8
+            getlen -= 8
+            j = d_len[i] - 2
+            i = (i << j) | (getbuf >> (32 - j))
+            getbuf <<= j
+            getlen -= j
+            i = (r - ((d_code[i >> j] << 6) | (i & 0x3f)) - 1) & (N - 1)
+            j = c - 255 + THRESHOLD
+            for k in range(j):
+                if count >= textsize:
+                    break
+                c = st.text_buf[(i + k) & (N - 1)]
+                dst[count] = c
+                count += 1
+                st.text_buf[r] = c
+                r = (r + 1) & (N - 1)
+        # Symbols decoded from the zero padding mean the input was truncated
+        if pos > codesize and (pos - codesize) * 8 > getlen:
+            raise ValueError("LZHUF input exhausted before the declared length")
+    return bytes(out)
@@ -0,0 +1,527 @@
+/*
+ * pyfbb/fbb/csrc/lzhuf.c
+ * Copyright (C) 2025-2026 Kris Kirby, KE4AHR
+ * SPDX-License-Identifier: LGPL-3.0-or-later
+ *
+ * Plain C LZHUF codec (LZSS + adaptive Huffman), loaded through ctypes by
+ * fbb/lzhuf.py when built. Streams are byte-identical to the pure-Python
+ * LZHUF_Comp: a 4-byte little-endian original length, then the bitstream.
+ *
+ * All state lives in a caller-independent struct, so calls are reentrant.
+ */
+
+#include <stddef.h>
+#include <stdint.h>
+#include <stdlib.h>
+#include <string.h>
+
+#define N           4096                /* size of ring buffer */
+#define F           60                  /* upper limit for match_length */
+#define THRESHOLD   2
+#define N_CHAR      (256 - THRESHOLD + F)
+#define T           (N_CHAR * 2 - 1)    /* size of table */
+#define R           (T - 1)             /* position of root */
+#define MAX_FREQ    0x8000
+#define NIL         N                   /* end of tree marker */
+
+#define FBB_LZHUF_OK        0
+#define FBB_LZHUF_OVERFLOW  -1
+#define FBB_LZHUF_NOMEM     -2
+#define FBB_LZHUF_TRUNCATED -3
+
+typedef struct {
+    unsigned char text_buf[N + F - 1];
+    int lson[N + 1], rson[N + 257], dad[N + 1];
+    unsigned freq[T + 1];
+    int prnt[T + N_CHAR];
+    int son[T];
+    int match_position, match_length;
+
+    /* bit writer */
+    uint8_t *out;
+    size_t out_pos, out_cap;
+    uint32_t putbuf;
+    int putlen;
+    int overflow;
+
+    /* bit reader */
+    const uint8_t *in;
+    size_t in_pos, in_len;
+    uint32_t getbuf;
+    int getlen;
+} lzhuf_state;
+
+/*
+ * Position coding: p_len/p_code encode the upper 6 bits of a match offset,
+ * d_len/d_code decode them from the next 8 input bits. Constant, so calls
+ * from several threads share them safely.
+ */
+static const unsigned char p_len[64] = {
+    0x03, 0x04, 0x04, 0x04, 0x05, 0x05, 0x05, 0x05, 0x05, 0x05, 0x05, 0x05, 0x06, 0x06, 0x06, 0x06,
+    0x06, 0x06, 0x06, 0x06, 0x06, 0x06, 0x06, 0x06, 0x07, 0x07, 0x07, 0x07, 0x07, 0x07, 0x07, 0x07,
+    0x07, 0x07, 0x07, 0x07, 0x07, 0x07, 0x07, 0x07, 0x07, 0x07, 0x07, 0x07, 0x07, 0x07, 0x07, 0x07,
+    0x08, 0x08, 0x08, 0x08, 0x08, 0x08, 0x08, 0x08, 0x08, 0x08, 0x08, 0x08, 0x08, 0x08, 0x08, 0x08
+};
+static const unsigned char p_code[64] = {
+    0x00, 0x20, 0x30, 0x40, 0x50, 0x58, 0x60, 0x68, 0x70, 0x78, 0x80, 0x88, 0x90, 0x94, 0x98, 0x9c,
+    0xa0, 0xa4, 0xa8, 0xac, 0xb0, 0xb4, 0xb8, 0xbc, 0xc0, 0xc2, 0xc4, 0xc6, 0xc8, 0xca, 0xcc, 0xce,
+    0xd0, 0xd2, 0xd4, 0xd6, 0xd8, 0xda, 0xdc, 0xde, 0xe0, 0xe2, 0xe4, 0xe6, 0xe8, 0xea, 0xec, 0xee,
+    0xf0, 0xf1, 0xf2, 0xf3, 0xf4, 0xf5, 0xf6, 0xf7, 0xf8, 0xf9, 0xfa, 0xfb, 0xfc, 0xfd, 0xfe, 0xff
+};
+static const unsigned char d_code[256] = {
+    0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00,
+    0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00,
+    0x01, 0x01, 0x01, 0x01, 0x01, 0x01, 0x01, 0x01, 0x01, 0x01, 0x01, 0x01, 0x01, 0x01, 0x01, 0x01,
+    0x02, 0x02, 0x02, 0x02, 0x02, 0x02, 0x02, 0x02, 0x02, 0x02, 0x02, 0x02, 0x02, 0x02, 0x02, 0x02,
+    0x03, 0x03, 0x03, 0x03, 0x03, 0x03, 0x03, 0x03, 0x03, 0x03, 0x03, 0x03, 0x03, 0x03, 0x03, 0x03,
+    0x04, 0x04, 0x04, 0x04, 0x04, 0x04, 0x04, 0x04, 0x05, 0x05, 0x05, 0x05, 0x05, 0x05, 0x05, 0x05,
+    0x06, 0x06, 0x06, 0x06, 0x06, 0x06, 0x06, 0x06, 0x07, 0x07, 0x07, 0x07, 0x07, 0x07, 0x07, 0x07,
+    0x08, 0x08, 0x08, 0x08, 0x08, 0x08, 0x08, 0x08, 0x09, 0x09, 0x09, 0x09, 0x09, 0x09, 0x09, 0x09,
+    0x0a, 0x0a, 0x0a, 0x0a, 0x0a, 0x0a, 0x0a, 0x0a, 0x0b, 0x0b, 0x0b, 0x0b, 0x0b, 0x0b, 0x0b, 0x0b,
+    0x0c, 0x0c, 0x0c, 0x0c, 0x0d, 0x0d, 0x0d, 0x0d, 0x0e, 0x0e, 0x0e, 0x0e, 0x0f, 0x0f, 0x0f, 0x0f,
+    0x10, 0x10, 0x10, 0x10, 0x11, 0x11, 0x11, 0x11, 0x12, 0x12, 0x12, 0x12, 0x13, 0x13, 0x13, 0x13,
+    0x14, 0x14, 0x14, 0x14, 0x15, 0x15, 0x15, 0x15, 0x16, 0x16, 0x16, 0x16, 0x17, 0x17, 0x17, 0x17,
+    0x18, 0x18, 0x19, 0x19, 0x1a, 0x1a, 0x1b, 0x1b, 0x1c, 0x1c, 0x1d, 0x1d, 0x1e, 0x1e, 0x1f, 0x1f,
+    0x20, 0x20, 0x21, 0x21, 0x22, 0x22, 0x23, 0x23, 0x24, 0x24, 0x25, 0x25, 0x26, 0x26, 0x27, 0x27,
+    0x28, 0x28, 0x29, 0x29, 0x2a, 0x2a, 0x2b, 0x2b, 0x2c, 0x2c, 0x2d, 0x2d, 0x2e, 0x2e, 0x2f, 0x2f,
+    0x30, 0x31, 0x32, 0x33, 0x34, 0x35, 0x36, 0x37, 0x38, 0x39, 0x3a, 0x3b, 0x3c, 0x3d, 0x3e, 0x3f
+};
+static const unsigned char d_len[256] = {
+    0x03, 0x03, 0x03, 0x03, 0x03, 0x03, 0x03, 0x03, 0x03, 0x03, 0x03, 0x03, 0x03, 0x03, 0x03, 0x03,
+    0x03, 0x03, 0x03, 0x03, 0x03, 0x03, 0x03, 0x03, 0x03, 0x03, 0x03, 0x03, 0x03, 0x03, 0x03, 0x03,
+    0x04, 0x04, 0x04, 0x04, 0x04, 0x04, 0x04, 0x04, 0x04, 0x04, 0x04, 0x04, 0x04, 0x04, 0x04, 0x04,
+    0x04, 0x04, 0x04, 0x04, 0x04, 0x04, 0x04, 0x04, 0x04, 0x04, 0x04, 0x04, 0x04, 0x04, 0x04, 0x04,
+    0x04, 0x04, 0x04, 0x04, 0x04, 0x04, 0x04, 0x04, 0x04, 0x04, 0x04, 0x04, 0x04, 0x04, 0x04, 0x04,
+    0x05, 0x05, 0x05, 0x05, 0x05, 0x05, 0x05, 0x05, 0x05, 0x05, 0x05, 0x05, 0x05, 0x05, 0x05, 0x05,
+    0x05, 0x05, 0x05, 0x05, 0x05, 0x05, 0x05, 0x05, 0x05, 0x05, 0x05, 0x05, 0x05, 0x05, 0x05, 0x05,
+    0x05, 0x05, 0x05, 0x05, 0x05, 0x05, 0x05, 0x05, 0x05, 0x05, 0x05, 0x05, 0x05, 0x05, 0x05, 0x05,
+    0x05, 0x05, 0x05, 0x05, 0x05, 0x05, 0x05, 0x05, 0x05, 0x05, 0x05, 0x05, 0x05, 0x05, 0x05, 0x05,
+    0x06, 0x06, 0x06, 0x06, 0x06, 0x06, 0x06, 0x06, 0x06, 0x06, 0x06, 0x06, 0x06, 0x06, 0x06, 0x06,
+    0x06, 0x06, 0x06, 0x06, 0x06, 0x06, 0x06, 0x06, 0x06, 0x06, 0x06, 0x06, 0x06, 0x06, 0x06, 0x06,
+    0x06, 0x06, 0x06, 0x06, 0x06, 0x06, 0x06, 0x06, 0x06, 0x06, 0x06, 0x06, 0x06, 0x06, 0x06, 0x06,
+    0x07, 0x07, 0x07, 0x07, 0x07, 0x07, 0x07, 0x07, 0x07, 0x07, 0x07, 0x07, 0x07, 0x07, 0x07, 0x07,
+    0x07, 0x07, 0x07, 0x07, 0x07, 0x07, 0x07, 0x07, 0x07, 0x07, 0x07, 0x07, 0x07, 0x07, 0x07, 0x07,
+    0x07, 0x07, 0x07, 0x07, 0x07, 0x07, 0x07, 0x07, 0x07, 0x07, 0x07, 0x07, 0x07, 0x07, 0x07, 0x07,
+    0x08, 0x08, 0x08, 0x08, 0x08, 0x08, 0x08, 0x08, 0x08, 0x08, 0x08, 0x08, 0x08, 0x08, 0x08, 0x08
+};
+
+static void start_huff(lzhuf_state *st)
+{
+    int i, j;
+
+    for (i = 0; i < N_CHAR; i++) {
+        st->freq[i] = 1;
+        st->son[i] = i + T;
+        st->prnt[i + T] = i;
+    }
+    for (i = 0, j = N_CHAR; j <= R; i += 2, j++) {
+        st->freq[j] = st->freq[i] + st->freq[i + 1];
+        st->son[j] = i;
+        st->prnt[i] = st->prnt[i + 1] = j;
+    }
+    st->freq[T] = 0xffff;
+    st->prnt[R] = 0;
+}
+
+static void reconst(lzhuf_state *st)
+{
+    int i, j, k;
+    unsigned f;
+
+    /* collect leaves in the first half of the table, halving their counts */
+    for (i = 0, j = 0; i < T; i++) {
+        if (st->son[i] >= T) {
+            st->freq[j] = (st->freq[i] + 1) / 2;
+            st->son[j] = st->son[i];
+            j++;
+        }
+    }
+    /* rebuild internal nodes, keeping the table sorted by frequency */
+    for (i = 0, j = N_CHAR; j < T; i += 2, j++) {
+        f = st->freq[j] = st->freq[i] + st->freq[i + 1];
+        for (k = j - 1; f < st->freq[k]; k--)
+            ;
+        k++;
+        memmove(&st->freq[k + 1], &st->freq[k], (size_t)(j - k) * sizeof(st->freq[0]));
+        st->freq[k] = f;
+        memmove(&st->son[k + 1], &st->son[k], (size_t)(j - k) * sizeof(st->son[0]));
+        st->son[k] = i;
+    }
+    for (i = 0; i < T; i++) {
+        k = st->son[i];
+        st->prnt[k] = i;
+        if (k < T)
+            st->prnt[k + 1] = i;
+    }
+}
+
+static void update(lzhuf_state *st, int c)
+{
+    int i, j, l;
+    unsigned k;
+
+    if (st->freq[R] == MAX_FREQ)
+        reconst(st);
+    c = st->prnt[c + T];
+    do {
+        k = ++st->freq[c];
+        /* if the sort order is disturbed, swap with the last node of lower count */
+        if (k > st->freq[l = c + 1]) {
+            while (k > st->freq[++l])
+                ;
+            l--;
+            st->freq[c] = st->freq[l];
+            st->freq[l] = k;
+
+            i = st->son[c];
+            st->prnt[i] = l;
+            if (i < T)
+                st->prnt[i + 1] = l;
+
+            j = st->son[l];
+            st->son[l] = i;
+
+            st->prnt[j] = c;
+            if (j < T)
+                st->prnt[j + 1] = c;
+            st->son[c] = j;
+
+            c = l;
+        }
+    } while ((c = st->prnt[c]) != 0);
+}
+
+static void init_tree(lzhuf_state *st)
+{
+    int i;
+
+    for (i = N + 1; i <= N + 256; i++)
+        st->rson[i] = NIL;
+    for (i = 0; i < N; i++)
+        st->dad[i] = NIL;
+}
+
+static void insert_node(lzhuf_state *st, int r)
+{
+    int i, p, cmp, c;
+    unsigned char *key = &st->text_buf[r];
+
+    cmp = 1;
+    p = N + 1 + key[0];
+    st->rson[r] = st->lson[r] = NIL;
+    st->match_length = 0;
+    for (;;) {
+        if (cmp >= 0) {
+            if (st->rson[p] != NIL) {
+                p = st->rson[p];
+            } else {
+                st->rson[p] = r;
+                st->dad[r] = p;
+                return;
+            }
+        } else {
+            if (st->lson[p] != NIL) {
+                p = st->lson[p];
+            } else {
+                st->lson[p] = r;
+                st->dad[r] = p;
+                return;
+            }
+        }
+        for (i = 1; i < F; i++)
+            if ((cmp = key[i] - st->text_buf[p + i]) != 0)
+                break;
+        if (i > st->match_length) {
+            st->match_position = ((r - p) & (N - 1)) - 1;
+            if ((st->match_length = i) >= F)
+                break;
+        } else if (i == st->match_length) {
+            if ((c = ((r - p) & (N - 1)) - 1) < st->match_position)
+                st->match_position = c;
+        }
+    }
+    st->dad[r] = st->dad[p];
+    st->lson[r] = st->lson[p];
+    st->rson[r] = st->rson[p];
+    st->dad[st->lson[p]] = r;
+    st->dad[st->rson[p]] = r;
+    if (st->rson[st->dad[p]] == p)
+        st->rson[st->dad[p]] = r;
+    else
+        st->lson[st->dad[p]] = r;
+    st->dad[p] = NIL;
+}
+
+static void delete_node(lzhuf_state *st, int p)
+{
+    int q;
+
+    if (st->dad[p] == NIL)
+        return;
+    if (st->rson[p] == NIL) {
+        q = st->lson[p];
+    } else if (st->lson[p] == NIL) {
+        q = st->rson[p];
+    } else {
+        q = st->lson[p];
+        if (st->rson[q] != NIL) {
+            do {
+                q = st->rson[q];
+            } while (st->rson[q] != NIL);
+            st->rson[st->dad[q]] = st->lson[q];
+            st->dad[st->lson[q]] = st->dad[q];
+            st->lson[q] = st->lson[p];
+            st->dad[st->lson[p]] = q;
+        }
+        st->rson[q] = st->rson[p];
+        st->dad[st->rson[p]] = q;
+    }
+    st->dad[q] = st->dad[p];
+    if (st->rson[st->dad[p]] == p)
+        st->rson[st->dad[p]] = q;
+    else
+        st->lson[st->dad[p]] = q;
+    st->dad[p] = NIL;
+}
+
+static void put_byte(lzhuf_state *st, unsigned c)
+{
+    if (st->out_pos < st->out_cap)
+        st->out[st->out_pos++] = (uint8_t)c;
+    else
+        st->overflow = 1;
+}
+
+/* Output the top l bits of the 16-bit left-aligned code c. */
+static void putcode(lzhuf_state *st, int l, unsigned c)
+{
+    st->putbuf |= (c & 0xffff) << (16 - st->putlen);
+    st->putlen += l;
+    while (st->putlen >= 8) {
+        put_byte(st, st->putbuf >> 24);
+        st->putbuf <<= 8;
+        st->putlen -= 8;
+    }
+}
+
+static void encode_char(lzhuf_state *st, unsigned c)
+{
+    unsigned i = 0;
+    int j = 0, k = st->prnt[c + T];
+
+    /* right children sit at odd table positions; the root bit ends up on top */
+    do {
+        i >>= 1;
+        if (k & 1)
+            i += 0x8000;
+        j++;
+    } while ((k = st->prnt[k]) != R);
+    putcode(st, j, i);
+    update(st, (int)c);
+}
+
+static void encode_position(lzhuf_state *st, unsigned c)
+{
+    unsigned i = c >> 6;
+
+    putcode(st, p_len[i], (unsigned)p_code[i] << 8);
+    putcode(st, 6, (c & 0x3f) << 10);
+}
+
+/*
+ * Compress n bytes from in into out (capacity out_cap).
+ * Returns FBB_LZHUF_OK and sets *out_n, or FBB_LZHUF_OVERFLOW if out is too small.
+ */
+int fbb_lzhuf_encode(const uint8_t *in, size_t n, uint8_t *out, size_t out_cap, size_t *out_n)
+{
+    lzhuf_state *st;
+    size_t text_pos;
+    int i, c, len, r, s, last_match_length, rc;
+
+    if (out_cap < 4 || n > 0xffffffffu)
+        return FBB_LZHUF_OVERFLOW;
+    out[0] = (uint8_t)n;
+    out[1] = (uint8_t)(n >> 8);
+    out[2] = (uint8_t)(n >> 16);
+    out[3] = (uint8_t)(n >> 24);
+    *out_n = 4;
+    if (n == 0)
+        return FBB_LZHUF_OK;
+
+    st = calloc(1, sizeof(*st));
+    if (st == NULL)
+        return FBB_LZHUF_NOMEM;
+    st->out = out;
+    st->out_pos = 4;
+    st->out_cap = out_cap;
+
+    start_huff(st);
+    init_tree(st);
+    s = 0;
+    r = N - F;
+    memset(st->text_buf, ' ', (size_t)r);
+    for (len = 0; len < F && (size_t)len < n; len++)
+        st->text_buf[r + len] = in[len];
+    text_pos = (size_t)len;
+    for (i = 1; i <= F; i++)
+        insert_node(st, r - i);
+    insert_node(st, r);
+
+    do {
+        if (st->match_length > len)
+            st->match_length = len;
+        if (st->match_length <= THRESHOLD) {
+            st->match_length = 1;
+            encode_char(st, st->text_buf[r]);
+        } else {
+            encode_char(st, 255 - THRESHOLD + st->match_length);
+            encode_position(st, (unsigned)st->match_position);
+        }
+        last_match_length = st->match_length;
+        for (i = 0; i < last_match_length && text_pos < n; i++) {
+            c = in[text_pos++];
+            delete_node(st, s);
+            st->text_buf[s] = (unsigned char)c;
+            if (s < F - 1)
+                st->text_buf[s + N] = (unsigned char)c;
+            s = (s + 1) & (N - 1);
+            r = (r + 1) & (N - 1);
+            insert_node(st, r);
+        }
+        while (i++ < last_match_length) {
+            delete_node(st, s);
+            s = (s + 1) & (N - 1);
+            r = (r + 1) & (N - 1);
+            if (--len)
+                insert_node(st, r);
+        }
+    } while (len > 0 && !st->overflow);
+
+    if (st->putlen)
+        put_byte(st, st->putbuf >> 24);
+
+    rc = st->overflow ? FBB_LZHUF_OVERFLOW : FBB_LZHUF_OK;
+    *out_n = st->out_pos;
+    free(st);
+    return rc;
+}
+
+static unsigned next_byte(lzhuf_state *st)
+{
+    /* past the end of input reads zeros; in_pos keeps counting them */
+    size_t pos = st->in_pos++;
+    return pos < st->in_len ? st->in[pos] : 0;
+}
+
+/* Nonzero once a symbol has consumed zero padding past the end of input */
+static int input_exhausted(const lzhuf_state *st)
+{
+    return st->in_pos > st->in_len
+        && (st->in_pos - st->in_len) * 8 > (size_t)st->getlen;
+}
+
+static int get_bit(lzhuf_state *st)
+{
+    int bit;
+
+    if (st->getlen <= 8) {
+        st->getbuf |= next_byte(st) << (24 - st->getlen);
+        st->getlen += 8;
+    }
+    bit = (int)(st->getbuf >> 31);
+    st->getbuf <<= 1;
+    st->getlen--;
+    return bit;
+}
+
+static int get_byte(lzhuf_state *st)
+{
+    int byte;
+
+    while (st->getlen <= 16) {
+        st->getbuf |= next_byte(st) << (24 - st->getlen);
+        st->getlen += 8;
+    }
+    byte = (int)(st->getbuf >> 24);
+    st->getbuf <<= 8;
+    st->getlen -= 8;
+    return byte;
+}
+
+static int decode_char(lzhuf_state *st)
+{
+    int c = st->son[R];
+
+    while (c < T)
+        c = st->son[c + get_bit(st)];
+    c -= T;
+    update(st, c);
+    return c;
+}
+
+static int decode_position(lzhuf_state *st)
+{
+    int i, j, c;
+
+    i = get_byte(st);
+    c = d_code[i] << 6;
+    j = d_len[i] - 2;
+    while (j--)
+        i = (i << 1) + get_bit(st);
+    return c | (i & 0x3f);
+}
+
+/*
+ * Decompress an LZHUF stream of n bytes into out, which must hold the
+ * original length given by the stream's 4-byte header. Returns
+ * FBB_LZHUF_OVERFLOW if it does not, and FBB_LZHUF_TRUNCATED if the input
+ * ends before that many bytes are decoded.
+ */
+int fbb_lzhuf_decode(const uint8_t *in, size_t n, uint8_t *out, size_t out_cap, size_t *out_n)
+{
+    lzhuf_state *st;
+    size_t textsize, count = 0;
+    int c, i, j, k, r;
+
+    *out_n = 0;
+    if (n < 4)
+        return FBB_LZHUF_OK;
+    textsize = (size_t)in[0] | (size_t)in[1] << 8 | (size_t)in[2] << 16 | (size_t)in[3] << 24;
+    if (textsize > out_cap)
+        return FBB_LZHUF_OVERFLOW;
+
+    st = calloc(1, sizeof(*st));
+    if (st == NULL)
+        return FBB_LZHUF_NOMEM;
+    st->in = in;
+    st->in_pos = 4;
+    st->in_len = n;
+
+    start_huff(st);
+    r = N - F;
+    memset(st->text_buf, ' ', (size_t)r);
+    while (count < textsize) {
+        c = decode_char(st);
+        if (c < 256) {
+            out[count++] = (uint8_t)c;
+            st->text_buf[r++] = (unsigned char)c;
+            r &= (N - 1);
+        } else {
+            i = (r - decode_position(st) - 1) & (N - 1);
+            j = c - 255 + THRESHOLD;
+            for (k = 0; k < j && count < textsize; k++) {
+                c = st->text_buf[(i + k) & (N - 1)];
+                out[count++] = (uint8_t)c;
+                st->text_buf[r++] = (unsigned char)c;
+                r &= (N - 1);
+            }
+        }
+        if (input_exhausted(st)) {
+            free(st);
+            return FBB_LZHUF_TRUNCATED;
+        }
+    }
+    *out_n = count;
+    free(st);
+    return FBB_LZHUF_OK;
+}
@@ -1,424 +1,638 @@
------
-pyfbb/fbb/forwarder.py
------
+# pyfbb/fbb/forwarder.py
+# Copyright (C) 2025-2026 Kris Kirby, KE4AHR
+# SPDX-License-Identifier: LGPL-3.0-or-later
 
-    # Copyright (C) 2025-2026 Kris Kirby, KE4AHR
-    # SPDX-License-Identifier: LGPL-3.0-or-later
+"""
+Main FBB forwarding implementation with full protocol support, resume, XFWD, traffic limiting, and Winlink B2F compatibility.
+"""
 
-    """
-    Main FBB forwarding implementation with full protocol support, resume, XFWD, traffic limiting, and Winlink B2F compatibility.
-    """
+import asyncio
+import hashlib
+import hmac
+import socket
+import time
+import logging
+import warnings
+import zlib
+from concurrent.futures import Executor
+from datetime import datetime
+from typing import List, Dict, Any, Optional, Set, Tuple
+from pathlib import Path
+
+from .lzhuf import LZHUF_Comp
+from .transport import FBBProtocolError, Transport
+
+try:
+    import lz4.frame as _lz4
+except ImportError:
+    _lz4 = None
 
-    import socket
-    import time
-    import logging
-    import gzip
-    from datetime import datetime
-    from typing import List, Dict, Any, Optional, Tuple
-    from pathlib import Path
+try:
+    import zstandard as _zstd
+except ImportError:
+    _zstd = None
 
-    from .lzhuf import LZHUF_Comp
-    from .transport import Transport
+_PROPOSAL_PREFIXES = ('FA', 'FB', 'FC')
+# Bytes that ^Z/line framing of FA bodies cannot carry intact
+_FA_UNSAFE = b'\x1a\r\x00'
+_INFO_CODES = frozenset('-RH')
 
-    class FBBProtocolError(Exception):
-        """Raised for protocol-level errors."""
-        pass
+# Pre-encoded fixed protocol lines
+_FR = b'FR\r'
+_FF = b'FF\r'
+_FQ = b'FQ\r'
+_F_END = b'F>\r'
+
+_LOG_FORMAT = '%(asctime)s [%(levelname)s] %(message)s'
+
+def configure_logging(path: Optional[str] = None, level: int = logging.INFO) -> logging.Logger:
+    """
+    Attach a handler to the shared "pyfbb.forwarder" logger, once per process.
+    
+    :param path: Log file path (None = stderr)
+    :param level: Logger level
+    :return: The configured logger
+    """
+    logger = logging.getLogger("pyfbb.forwarder")
+    logger.setLevel(level)
+    if not logger.handlers:
+        handler = logging.FileHandler(path) if path else logging.StreamHandler()
+        handler.setFormatter(logging.Formatter(_LOG_FORMAT))
+        logger.addHandler(handler)
+    return logger
 
-    class ConfigError(Exception):
-        """Raised for configuration errors."""
-        pass
+class ConfigError(Exception):
+    """Raised for configuration errors."""
+    pass
 
-    class FBBForwarder:
+class FBBForwarder:
+    """
+    Full F6FBB forwarding protocol implementation with Winlink B2F extensions.
+    
+    Supports:
+    - ASCII (FA), binary (FB), B2F (FC) proposals
+    - Reverse forwarding (FR)
+    - Resume support
+    - XFWD extended forwarding
+    - Traffic limiting
+    - Authentication (;PQ/;PR)
+    - Multi-account (;FW)
+    - Gzip compression option
+    """
+    
+    MAX_PROPOSALS = 5  # FBB protocol limit per proposal block
+    
+    FS_CODES = {
+        '+': 'Accepted',
+        '-': 'Rejected (duplicate/old)',
+        '=': 'Held (local delivery)',
+        'R': 'Rejected (no route)',
+        'H': 'Held (traffic limit)',
+        'E': 'Error (invalid)'
+    }
+    
+    def __init__(
+        self,
+        transport: Transport,
+        sid: str = "[PyFBB-0.1.2-B1FHLM$]",
+        use_binary: bool = True,
+        enable_reverse: bool = True,
+        traffic_limit: int = 1024 * 1024,  # 1MB default
+        log_file: Optional[str] = None,
+        use_gzip: bool = False,
+        compression: Optional[str] = None,
+        compression_threshold: int = 64,
+        entropy_skip: bool = True,
+        gzip_level: int = 1
+    ):
         """
-        Full F6FBB forwarding protocol implementation with Winlink B2F extensions.
+        Initialize forwarder.
         
-        Supports:
-        - ASCII (FA), binary (FB), B2F (FC) proposals
-        - Reverse forwarding (FR)
-        - Resume support
-        - XFWD extended forwarding
-        - Traffic limiting
-        - Authentication (;PQ/;PR)
-        - Multi-account (;FW)
-        - Gzip compression option
+        :param transport: Transport instance
+        :param sid: SID string to send
+        :param use_binary: Enable binary/B2F mode
+        :param enable_reverse: Allow reverse forwarding
+        :param traffic_limit: Bytes per session limit (0 = unlimited)
+        :param log_file: Deprecated; call configure_logging() once instead
+        :param use_gzip: Use gzip instead of LZHUF for B2F
+        :param compression: Binary codec ("lzhuf", "gzip", "lz4", "zstd");
+            overrides use_gzip. Both ends must be configured alike.
+        :param compression_threshold: Messages shorter than this are proposed as FA (uncompressed)
+        :param entropy_skip: Propose already high-entropy content as FA instead of compressing
+        :param gzip_level: zlib level for the gzip backend (1 = fastest)
         """
+        self.transport = transport
+        self.sid = sid
+        self.use_binary = use_binary
+        self.enable_reverse = enable_reverse
+        self.traffic_limit = traffic_limit
+        self.compression_threshold = compression_threshold
+        self.entropy_skip = entropy_skip
+        self.gzip_level = gzip_level
+        self._lzhuf = LZHUF_Comp()
+        self._set_compression(compression or ("gzip" if use_gzip else "lzhuf"))
         
-        FS_CODES = {
-            '+': 'Accepted',
-            '-': 'Rejected (duplicate/old)',
-            '=': 'Held (local delivery)',
-            'R': 'Rejected (no route)',
-            'H': 'Held (traffic limit)',
-            'E': 'Error (invalid)'
-        }
+        self.logger = logging.getLogger("pyfbb.forwarder")
         
-        def __init__(
-            self,
-            transport: Transport,
-            sid: str = "[PyFBB-0.1.2-B1FHLM$]",
-            use_binary: bool = True,
-            enable_reverse: bool = True,
-            traffic_limit: int = 1024 * 1024,  # 1MB default
-            log_file: Optional[str] = None,
-            use_gzip: bool = False
-        ):
-            """
-            Initialize forwarder.
-            
-            :param transport: Transport instance
-            :param sid: SID string to send
-            :param use_binary: Enable binary/B2F mode
-            :param enable_reverse: Allow reverse forwarding
-            :param traffic_limit: Bytes per session limit (0 = unlimited)
-            :param log_file: Optional log file path
-            :param use_gzip: Use gzip instead of LZHUF for B2F
-            """
-            self.transport = transport
-            self.sid = sid
-            self.use_binary = use_binary
-            self.enable_reverse = enable_reverse
-            self.traffic_limit = traffic_limit
-            self.use_gzip = use_gzip
-            
-            self.logger = logging.getLogger("pyfbb.forwarder")
-            self.logger.setLevel(logging.DEBUG)
+        if log_file:
+            warnings.warn(
+                "log_file is deprecated; call configure_logging() once per process",
+                DeprecationWarning,
+                stacklevel=2
+            )
+            configure_logging(log_file, logging.DEBUG)
+        
+        self.messages_to_send: List[Dict[str, Any]] = []
+        self.received_messages: List[Dict[str, Any]] = []
+        self._received_mids: Set[str] = set()  # MIDs already received, for duplicate checks
+        self._accepted: List[Tuple[str, int, str]] = []  # (MID, size, command) accepted by the last FS response
+        self.sent_bytes = 0
+        self.resume_offsets: Dict[str, int] = {}  # MID -> offset
+        self._rxbuf = bytearray()  # Bytes received but not yet consumed
+        self._txbuf = bytearray()  # Outbound bytes queued for the next flush
+        
+        self.logger.info("FBBForwarder initialized with SID: %s", sid)
+
+    @property
+    def use_gzip(self) -> bool:
+        """True when the gzip backend is selected."""
+        return self.compression == "gzip"
+
+    @use_gzip.setter
+    def use_gzip(self, value: bool):
+        self._set_compression("gzip" if value else "lzhuf")
+
+    def _set_compression(self, compression: str):
+        """Resolve compressor/decompressor callables for the selected backend once."""
+        if compression == "lzhuf":
+            compressor, decompressor = self._lzhuf_compress, self._lzhuf_decompress
+        elif compression == "gzip":
+            # zlib with gzip framing (wbits=31): same wire format as gzip.compress
+            self._gzip_template = zlib.compressobj(self.gzip_level, zlib.DEFLATED, 31)
+            compressor, decompressor = self._gzip_compress, self._gzip_decompress
+        elif compression == "lz4":
+            if _lz4 is None:
+                raise ImportError("lz4 required for lz4 compression")
+            compressor, decompressor = _lz4.compress, _lz4.decompress
+        elif compression == "zstd":
+            if _zstd is None:
+                raise ImportError("zstandard required for zstd compression")
+            compressor = _zstd.ZstdCompressor(level=3).compress
+            decompressor = _zstd.ZstdDecompressor().decompress
+        else:
+            raise ConfigError(f"Unknown compression backend: {compression}")
+        self.compression = compression
+        self._compressor = compressor
+        self._decompressor = decompressor
+
+    def _gzip_compress(self, data: bytes) -> bytes:
+        """Gzip-compress via a copy of the preconfigured zlib stream."""
+        comp = self._gzip_template.copy()
+        return comp.compress(data) + comp.flush()
+
+    def _gzip_decompress(self, data: bytes) -> bytes:
+        """Decompress a gzip member."""
+        return zlib.decompress(data, 31)
+
+    def _lzhuf_compress(self, data: bytes) -> bytes:
+        """Compress with LZHUF for legacy FBB peers."""
+        return self._lzhuf.encode_bytes(data)
+
+    def _lzhuf_decompress(self, data: bytes) -> bytes:
+        """Decompress LZHUF data from legacy FBB peers, bounded by the traffic limit."""
+        return self._lzhuf.decode_bytes(data, self.traffic_limit or None)
+
+    def connect(self, initiate_reverse: bool = False):
+        """Connect and perform SID negotiation."""
+        try:
+            self.transport.connect()
+            server_sid = self._recv_line().strip()
+            if not (server_sid.startswith('[') and server_sid.endswith(']') and '$' in server_sid):
+                raise FBBProtocolError(f"Invalid SID format: {server_sid}")
             
-            if log_file:
-                handler = logging.FileHandler(log_file)
-                formatter = logging.Formatter('%(asctime)s [%(levelname)s] %(message)s')
-                handler.setFormatter(formatter)
-                self.logger.addHandler(handler)
+            self._send_line(self.sid)
             
-            self.messages_to_send: List[Dict[str, Any]] = []
-            self.received_messages: List[Dict[str, Any]] = []
-            self.sent_bytes = 0
-            self.resume_offsets: Dict[str, int] = {}  # MID -> offset
+            if initiate_reverse and self.enable_reverse:
+                self.transport.send(_FR)
+                response = self._recv_line().strip()
+                if response == "FR+":
+                    self.logger.info("Reverse forwarding accepted")
+                else:
+                    self.logger.warning("Reverse denied: %s", response)
             
-            self.logger.info("FBBForwarder initialized with SID: %s", sid)
+            self._forwarding_loop()
+        except Exception as e:
+            self.logger.error("Connection failed: %s", e)
+            raise FBBProtocolError(f"Connection error: {e}")
 
-        def _log(self, level: str, message: str, **kwargs):
-            """Internal logging helper."""
-            self.logger.log(getattr(logging, level.upper()), message, extra=kwargs)
+    async def connect_async(self, initiate_reverse: bool = False, executor: Optional[Executor] = None):
+        """
+        Run the blocking connect() and forwarding session in an executor thread.
+        
+        This is a thread offload, not non-blocking I/O: the transport keeps its
+        blocking reads and each session occupies one worker thread until it ends.
+        The event loop stays free while awaiting, so size the executor to the
+        number of sessions awaited concurrently (e.g. with asyncio.gather).
+        
+        :param initiate_reverse: Request reverse forwarding (FR)
+        :param executor: Executor to run the session in (None = the loop's default)
+        """
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(executor, self.connect, initiate_reverse)
 
-        def connect(self, initiate_reverse: bool = False):
-            """Connect and perform SID negotiation."""
-            try:
-                self.transport.connect()
-                server_sid = self._recv_line().strip()
-                if not (server_sid.startswith('[') and server_sid.endswith(']') and '$' in server_sid):
-                    raise FBBProtocolError(f"Invalid SID format: {server_sid}")
-                
-                self._send_line(self.sid)
-                
-                if initiate_reverse and self.enable_reverse:
-                    self._send_line("FR")
-                    response = self._recv_line().strip()
-                    if response == "FR+":
-                        self._log("info", "Reverse forwarding accepted")
-                    else:
-                        self._log("warning", f"Reverse denied: {response}")
-                
-                self._forwarding_loop()
-            except Exception as e:
-                self._log("error", f"Connection failed: {e}")
-                raise FBBProtocolError(f"Connection error: {e}")
-
-        def _recv_line(self) -> str:
-            """Receive a line from transport."""
-            data = b''
-            while True:
-                byte = self.transport.recv(1)
-                if not byte:
-                    raise FBBProtocolError("Connection closed during line receive")
-                if byte in (b'\r', b'\n'):
-                    if data:
-                        break
-                else:
-                    data += byte
-            return data.decode('latin-1', errors='replace')
+    def _recv_line(self) -> str:
+        """Receive a line from transport, reading in blocks into the receive buffer."""
+        buf = self._rxbuf
+        while True:
+            cr = buf.find(b'\r')
+            lf = buf.find(b'\n')
+            idx = cr if lf < 0 or 0 <= cr < lf else lf
+            if idx > 0:
+                line = bytes(buf[:idx])
+                # Take the LF of a CRLF with its CR, so that it cannot become
+                # the first byte of a binary body read straight from the buffer
+                del buf[:idx + 2 if buf[idx:idx + 2] == b'\r\n' else idx + 1]
+                return line.decode('latin-1', errors='replace')
+            if idx == 0:
+                # Empty line or second half of CRLF
+                del buf[:1]
+                continue
+            chunk = self.transport.recv(4096)
+            if not chunk:
+                raise FBBProtocolError("Connection closed during line receive")
+            buf += chunk
+
+    def _send_line(self, line):
+        """Send a line (str or already-encoded bytes) to transport."""
+        data = line.encode('latin-1') if isinstance(line, str) else line
+        self.transport.send(data + b'\r')
+
+    def _queue_line(self, line: str):
+        """Queue a line for the next flush."""
+        self._txbuf += line.encode('latin-1')
+        self._txbuf.append(0x0d)
+
+    def _flush(self):
+        """Send all queued output in a single transport write."""
+        if self._txbuf:
+            self.transport.send(bytes(self._txbuf))
+            self._txbuf.clear()
+
+    def _compress(self, data: str) -> bytes:
+        """Compress using the configured backend."""
+        try:
+            return self._compressor(data.encode('latin-1'))
+        except Exception as e:
+            self.logger.error("Compression failed: %s", e)
+            raise FBBProtocolError(f"Compression error: {e}")
 
-        def _send_line(self, line: str):
-            """Send a line to transport."""
-            self.transport.send((line + '\r').encode('latin-1'))
+    def _should_compress(self, raw: bytes) -> bool:
+        """Return False for payloads too small or too random to shrink under compression."""
+        if len(raw) < self.compression_threshold:
+            return False
+        # Many distinct byte values in the first 512 bytes: already compressed/encrypted
+        if self.entropy_skip and len(set(raw[:512])) > 200:
+            return False
+        return True
 
-        def _compress(self, data: str) -> bytes:
-            """Compress using gzip or LZHUF."""
+    @staticmethod
+    def _fa_safe(raw: bytes) -> bool:
+        """Return True if raw survives FA framing (lines terminated by ^Z)."""
+        return not any(b in raw for b in _FA_UNSAFE)
+
+    def _forwarding_loop(self):
+        """
+        Main forwarding loop implementing full FBB protocol with resume, XFWD, traffic limiting, and B2F.
+        """
+        self.logger.info("Starting forwarding loop")
+        my_turn = self.enable_reverse  # If reverse accepted, we propose first
+        
+        while True:
             try:
-                if self.use_gzip:
-                    return gzip.compress(data.encode('latin-1'))
-                return LZHUF_Comp().encode(data)
-            except Exception as e:
-                self._log("error", f"Compression failed: {e}")
-                raise FBBProtocolError(f"Compression error: {e}")
-
-        def _forwarding_loop(self):
-            """
-            Main forwarding loop implementing full FBB protocol with resume, XFWD, traffic limiting, and B2F.
-            """
-            self._log("info", "Starting forwarding loop")
-            my_turn = self.enable_reverse  # If reverse accepted, we propose first
-            
-            while True:
-                try:
-                    if my_turn:
-                        if not self._send_proposal():
-                            self._send_line("FF")
-                            my_turn = False
-                            continue
-                    else:
-                        proposal = self._recv_proposal()
-                        if proposal in ("FF", "FQ"):
-                            if proposal == "FQ":
-                                self._send_line("FQ")
-                                break
+                if my_turn:
+                    if not self._send_proposal():
+                        self.transport.send(_FF)
+                        my_turn = False
+                        continue
+                else:
+                    proposal = self._recv_proposal()
+                    if proposal in ("FF", "FQ"):
+                        if proposal == "FQ":
+                            self.transport.send(_FQ)
                             break
-                        
-                        fs_response = self._process_proposal(proposal)
-                        self._send_line(f"FS {fs_response}")
-                        
-                        accepted = fs_response.count('+')
-                        if accepted:
-                            self._recv_messages(accepted)
+                        break
                     
-                    my_turn = not my_turn
-                except socket.timeout:
-                    self._log("error", "Session timeout")
-                    break
-                except FBBProtocolError as e:
-                    self._log("error", f"Protocol error: {e}")
-                    self._send_line("FQ")
-                    break
-
-        def _recv_proposal(self) -> str:
-            """Receive proposal block until F>."""
-            proposal = []
-            while True:
-                line = self._recv_line()
-                if line == "F>":
-                    break
-                proposal.append(line)
-            return '\n'.join(proposal)
-
-        def _send_proposal(self) -> bool:
-            """
-            Build and send proposal block with resume support and traffic limit check.
-            
-            :return: True if proposal sent, False if no messages
-            """
-            if not self.messages_to_send:
-                return False
-            
-            if self.sent_bytes >= self.traffic_limit > 0:
-                self._log("warning", "Traffic limit reached - sending FF")
-                return False
+                    fs_response = self._process_proposal(proposal)
+                    self._send_line(f"FS {fs_response}")
+                    
+                    if self._accepted:
+                        self._recv_messages(self._accepted)
+                
+                my_turn = not my_turn
+            except socket.timeout:
+                self.logger.error("Session timeout")
+                break
+            except FBBProtocolError as e:
+                self.logger.error("Protocol error: %s", e)
+                self.transport.send(_FQ)
+                break
+
+    def _recv_proposal(self) -> str:
+        """Receive proposal block until F>, or a bare FF/FQ."""
+        proposal = []
+        while True:
+            line = self._recv_line()
+            if line == "F>":
+                break
+            if not proposal and line in ("FF", "FQ"):
+                # End-of-turn and quit are single lines without F>
+                return line
+            proposal.append(line)
+        return '\n'.join(proposal)
+
+    def _send_proposal(self) -> bool:
+        """
+        Build and send proposal block with resume support and traffic limit check.
+        
+        :return: True if proposal sent, False if no messages
+        """
+        if not self.messages_to_send:
+            return False
+        
+        if self.sent_bytes >= self.traffic_limit > 0:
+            self.logger.warning("Traffic limit reached - sending FF")
+            return False
+        
+        proposal_lines = []
+        pending = []
+        size = 0
+        budget = self.transport.mtu
+        
+        for msg in self.messages_to_send[:self.MAX_PROPOSALS]:
+            # Built once per message: the same blob is sent if the message is
+            # accepted, or proposed again if it overflows this block
+            if '_proposal' not in msg:
+                msg['_proposal'] = self._proposal_body(msg)
+            cmd, body, msg_size = msg['_proposal']
             
-            proposal_lines = []
-            pending = []
-            size = 0
+            # Fill one link-level window; an oversized first message still goes alone
+            if pending and size + msg_size > budget:
+                break
             
-            for msg in self.messages_to_send[:5]:
-                msg_size = len(msg['content'].encode('latin-1'))
-                if self.use_binary:
-                    msg_size = len(self._compress(msg['content']))
+            line = f"{cmd} {msg['type']} {msg['from']} {msg['to_bbs']} {msg['to_call']} {msg['mid']} {msg_size}"
+            proposal_lines.append(line)
+            pending.append((msg, body))
+            size += msg_size
+        
+        self.logger.debug("Sending proposal: %d messages", len(proposal_lines))
+        for line in proposal_lines:
+            self._queue_line(line)
+        self._txbuf += _F_END
+        self._flush()
+        
+        fs = self._recv_line().strip()
+        if not fs.startswith("FS "):
+            raise FBBProtocolError(f"Invalid FS response: {fs}")
+        fs_response = fs[3:]
+        
+        self.logger.info("FS response: %s", fs_response)
+        if len(fs_response) != len(pending):
+            raise FBBProtocolError(f"FS response has {len(fs_response)} codes for {len(pending)} proposals")
+        
+        for code, (msg, body) in zip(fs_response, pending):
+            if code == '+':
+                self._queue_message(msg, body, binary=body is not None)
+                self.sent_bytes += len(msg['content'].encode('latin-1'))
+                self.logger.info("Sent %s", msg['mid'])
+            elif code in _INFO_CODES:
+                self.logger.warning("%s %s", msg['mid'], self.FS_CODES[code])
+            elif code == 'E':
+                self.logger.error("%s invalid", msg['mid'])
+        self._flush()
+        
+        # Remove proposed messages; pending is always a prefix of the queue
+        del self.messages_to_send[:len(pending)]
+        return True
+
+    def _proposal_body(self, msg: Dict) -> Tuple[str, Optional[bytes], int]:
+        """
+        Choose the proposal type for a message and build its length-framed body.
+        
+        :param msg: Message record
+        :return: (command, body or None for FA, proposed size)
+        """
+        raw = msg['content'].encode('latin-1')
+        if not self.use_binary:
+            return "FA", None, len(raw)
+        if not self._should_compress(raw) and self._fa_safe(raw):
+            return "FA", None, len(raw)
+        # FB is LZHUF-compressed in F6FBB, so binary that FA cannot carry is
+        # compressed and sent as FC even when that gains nothing
+        body = self._compress(msg['content'])
+        return "FC", body, len(body)
+
+    def _process_proposal(self, proposal: str) -> str:
+        """Process received proposal and return FS response."""
+        lines = proposal.splitlines()
+        fs_parts = []
+        accepted = self._accepted = []
+        for line in lines:
+            if line.startswith(_PROPOSAL_PREFIXES):
+                # Fields past the size (e.g. B2F compressed size) are not tokenized
+                parts = line.split(None, 7)
+                if len(parts) < 7:
+                    fs_parts.append('E')
+                    continue
+                cmd, msg_type, from_call, to_bbs, to_call, mid, size_str = parts[:7]
+                # isdecimal() rejects Latin-1 superscripts that isdigit() lets through
+                if not size_str.isdecimal():
+                    fs_parts.append('E')
+                    continue
+                size = int(size_str)
                 
-                if size + msg_size > 256 * 1024:  # Reasonable block size limit
-                    break
+                # Traffic limit check
+                if self.sent_bytes + size > self.traffic_limit > 0:
+                    fs_parts.append('H')
+                    continue
                 
-                cmd = "FC" if self.use_binary else "FA"
-                line = f"{cmd} {msg['type']} {msg['from']} {msg['to_bbs']} {msg['to_call']} {msg['mid']} {msg_size}"
-                proposal_lines.append(line)
-                pending.append(msg)
-                size += msg_size
-            
-            if not proposal_lines:
-                return False
-            
-            self._log("debug", f"Sending proposal: {len(proposal_lines)} messages")
-            for line in proposal_lines:
-                self._send_line(line)
-            self._send_line("F>")
-            
-            fs = self._recv_line().strip()
-            if not fs.startswith("FS "):
-                raise FBBProtocolError(f"Invalid FS response: {fs}")
-            fs_response = fs[3:]
-            
-            self._log("info", f"FS response: {fs_response}")
-            
-            for i, code in enumerate(fs_response):
-                if code == '+':
-                    self._send_message(pending[i])
-                    self.sent_bytes += len(pending[i]['content'].encode('latin-1'))
-                    self._log("info", f"Sent {pending[i]['mid']}")
-                elif code in ('-', 'R', 'H'):
-                    self._log("warning", f"{pending[i]['mid']} {self.FS_CODES[code]}")
-                elif code == 'E':
-                    self._log("error", f"{pending[i]['mid']} invalid")
-            
-            # Remove sent/accepted messages
-            self.messages_to_send = [m for m in self.messages_to_send if m not in pending]
-            return True
-
-        def _process_proposal(self, proposal: str) -> str:
-            """Process received proposal and return FS response."""
-            lines = proposal.split('\n')
-            fs = ''
-            for line in lines:
-                if line.startswith(('FA', 'FB', 'FC')):
-                    parts = line.split()
-                    if len(parts) < 7:
-                        fs += 'E'
-                        continue
-                    cmd, msg_type, from_call, to_bbs, to_call, mid, size_str = parts[:7]
-                    try:
-                        size = int(size_str)
-                    except ValueError:
-                        fs += 'E'
-                        continue
-                    
-                    # Traffic limit check
-                    if self.sent_bytes + size > self.traffic_limit > 0:
-                        fs += 'H'
-                        continue
-                    
-                    # Duplicate check
-                    if any(m['mid'] == mid for m in self.received_messages):
-                        fs += '-'
-                        continue
-                    
-                    fs += '+'
-                else:
-                    fs += 'E'
-            return fs
-
-        def _recv_messages(self, count: int):
-            """Receive accepted messages with resume support."""
-            for _ in range(count):
-                if self.use_binary:
-                    content = self._recv_binary_message()
-                else:
-                    content = self._recv_ascii_message()
-                self.received_messages.append({'content': content})
-                self.logger.info("Received message")
-
-        def _recv_ascii_message(self) -> str:
-            """Receive ASCII message terminated by ^Z."""
-            content = ""
-            while True:
-                line = self._recv_line()
-                if "\x1A" in line:
-                    content += line.split("\x1A")[0]
-                    break
-                content += line + "\n"
-            return content
-
-        def _recv_binary_message(self) -> str:
-            """Receive binary message with B2F support and gzip option."""
-            # Receive binary block
-            data = b''
-            while True:
-                chunk = self.transport.recv(4096)
-                if not chunk:
-                    break
-                data += chunk
-            
-            if not data:
-                raise FBBProtocolError("No data received for binary message")
-            
-            try:
-                if self.use_gzip:
-                    decompressed = gzip.decompress(data)
-                else:
-                    decompressed = LZHUF_Comp().decode(data)
-                return decompressed.decode('latin-1', errors='replace')
-            except Exception as e:
-                self.logger.error("Binary decompression failed: %s", e)
-                raise FBBProtocolError("Decompression error")
-
-        def _send_message(self, msg: Dict):
-            """Send single message with resume support."""
-            if self.use_binary:
-                self._send_binary_message(msg['content'])
+                # Duplicate check
+                if mid in self._received_mids:
+                    fs_parts.append('-')
+                    continue
+                
+                fs_parts.append('+')
+                accepted.append((mid, size, cmd))
+            else:
+                fs_parts.append('E')
+        return ''.join(fs_parts)
+
+    def _recv_messages(self, accepted: List[Tuple[str, int, str]]):
+        """
+        Receive accepted messages with resume support.
+        
+        :param accepted: (MID, proposed size, proposal command) tuples in proposal order
+        """
+        for mid, size, cmd in accepted:
+            if cmd == 'FA':
+                content = self._recv_ascii_message()
             else:
-                self._send_line(msg['content'] + "\x1A")
-            self.logger.info("Sent message MID=%s", msg.get('mid', 'unknown'))
+                content = self._recv_binary_message(size)
+            self.received_messages.append({'mid': mid, 'content': content})
+            self._received_mids.add(mid)
+            self.logger.info("Received message")
+
+    def _recv_ascii_message(self) -> str:
+        """Receive ASCII message terminated by ^Z."""
+        content = ""
+        while True:
+            line = self._recv_line()
+            if "\x1A" in line:
+                content += line.split("\x1A")[0]
+                break
+            content += line + "\n"
+        return content
+
+    def _recv_binary_message(self, size: int) -> str:
+        """
+        Receive binary message with B2F support and gzip option.
+        
+        :param size: Body size announced in the proposal
+        """
+        if size <= 0:
+            raise FBBProtocolError("No data received for binary message")
+        
+        # Read exactly size bytes, starting with anything left over from line reads
+        buf = bytearray(size)
+        view = memoryview(buf)
+        offset = min(len(self._rxbuf), size)
+        view[:offset] = self._rxbuf[:offset]
+        del self._rxbuf[:offset]
+        while offset < size:
+            chunk = self.transport.recv(size - offset)
+            if not chunk:
+                raise FBBProtocolError("Connection closed during binary receive")
+            n = min(len(chunk), size - offset)
+            view[offset:offset + n] = chunk[:n]
+            # Frame-oriented transports may return more than asked for
+            self._rxbuf += chunk[n:]
+            offset += n
+        
+        try:
+            decompressed = self._decompressor(bytes(buf))
+            return decompressed.decode('latin-1', errors='replace')
+        except Exception as e:
+            self.logger.error("Binary decompression failed: %s", e)
+            raise FBBProtocolError("Decompression error")
+
+    def _send_message(self, msg: Dict):
+        """Send single message with resume support."""
+        self._queue_message(msg)
+        self._flush()
 
-        def _send_binary_message(self, content: str):
-            """Send binary message with B2F and gzip."""
+    def _queue_message(self, msg: Dict, compressed: Optional[bytes] = None, binary: Optional[bool] = None):
+        """
+        Queue single message for the next flush.
+        
+        :param msg: Message record
+        :param compressed: Compressed body built for the proposal, if any
+        :param binary: Send length-framed (default: session's use_binary)
+        """
+        if binary is None:
+            binary = self.use_binary
+        if binary:
+            self._queue_binary_message(msg['content'], compressed)
+        else:
+            self._queue_line(msg['content'] + "\x1A")
+        self.logger.info("Queued message MID=%s", msg.get('mid', 'unknown'))
+
+    def _queue_binary_message(self, content: str, compressed: Optional[bytes] = None):
+        """Queue binary message with B2F and gzip."""
+        if compressed is None:
             compressed = self._compress(content)
-            self.transport.send(compressed)
-            self.logger.debug("Sent binary block %d bytes (compressed)", len(compressed))
+        self._txbuf += compressed
+        self.logger.debug("Queued binary block %d bytes", len(compressed))
 
-        def _authenticate(self):
-            """Handle ;PQ/;PR authentication if required."""
+    def _auth_response(self, challenge: str, algorithm: str, secret: str) -> str:
+        """Compute ;PR response: HMAC-SHA256 when negotiated, legacy MD5 otherwise."""
+        if algorithm == "sha256":
+            return hmac.new(secret.encode(), challenge.encode(), hashlib.sha256).hexdigest()
+        return hashlib.md5((challenge + secret).encode()).hexdigest()
+
+    def _authenticate(self):
+        """Handle ;PQ/;PR authentication if required."""
+        line = self._recv_line()
+        algorithm = "md5"  # Legacy peers do not announce an algorithm
+        if line.startswith(";PA"):
+            # Peer advertises a hash algorithm ahead of the challenge
+            if line[3:].strip().lower() == "sha256":
+                algorithm = "sha256"
             line = self._recv_line()
-            if line.startswith(";PQ"):
-                challenge = line[3:].strip()
-                import hashlib
-                # Use configured secret (in real code, from config)
-                secret = "shared_secret"
-                response = hashlib.md5((challenge + secret).encode()).hexdigest()
-                self._send_line(f";PR {response}")
-                self.logger.info("Authentication challenge responded")
-            elif line.startswith(";PR"):
-                # Server mode verification
-                self.logger.info("Authentication completed")
-
-        def _handle_xfwd(self, proposal: str):
-            """Handle XFWD extended forwarding proposals."""
-            if "XFWD" in proposal:
-                self.logger.info("XFWD negotiation in progress")
-                # Full XFWD implementation with capability exchange
-
-        def _enforce_traffic_limit(self):
-            """Check and enforce session traffic limit."""
-            if self.traffic_limit > 0 and self.sent_bytes >= self.traffic_limit:
-                self.logger.warning("Traffic limit exceeded - sending H response")
-                # In next proposal, mark excess messages with H
-
-        def _handle_resume(self, mid: str, offset: int):
-            """Handle resume request for MID at offset."""
-            self.logger.info("Resumed transfer for MID=%s at offset %d", mid, offset)
-            # Full resume logic with offset seeking in binary send
-
-        def _validate_b2f_headers(self, headers: Dict):
-            """Validate Winlink B2F headers."""
-            required = ["Mid", "Date", "Type", "To", "From", "Subject"]
-            for key in required:
-                if key not in headers:
-                    raise FBBProtocolError(f"Missing B2F header: {key}")
-            self.logger.debug("B2F headers validated")
-
-        def _handle_large_attachment(self, content: bytes):
-            """Chunk large attachments for B2F."""
-            self.logger.info("Handled large attachment chunking")
-            # Full chunking logic with B2F offset headers
-
-        def close(self):
-            """Close forwarding session."""
-            try:
-                self._send_line("FQ")
-                self.transport.close()
-                self.logger.info("Forwarding session closed")
-            except Exception as e:
-                self.logger.error("Error during session close: %s", e)
-
-        def add_message(self, msg_type: str, from_call: str, to_bbs: str, to_call: str, mid: str, content: str):
-            """Add message to send queue."""
-            self.messages_to_send.append({
-                'type': msg_type,
-                'from': from_call,
-                'to_bbs': to_bbs,
-                'to_call': to_call,
-                'mid': mid,
-                'content': content
-            })
-            self.logger.debug("Added message MID=%s to send queue", mid)
-
-        def get_received_messages(self) -> List[Dict]:
-            """Return received messages and clear list."""
-            msgs = self.received_messages
-            self.received_messages = []
-            return msgs
+        if line.startswith(";PQ"):
+            challenge = line[3:].strip()
+            # Use configured secret (in real code, from config)
+            secret = "shared_secret"
+            response = self._auth_response(challenge, algorithm, secret)
+            self._send_line(f";PR {response}")
+            self.logger.info("Authentication challenge responded (%s)", algorithm)
+        elif line.startswith(";PR"):
+            # Server mode verification
+            self.logger.info("Authentication completed")
+
+    def _handle_xfwd(self, proposal: str):
+        """Handle XFWD extended forwarding proposals."""
+        if "XFWD" in proposal:
+            self.logger.info("XFWD negotiation in progress")
+            # Full XFWD implementation with capability exchange
+
+    def _enforce_traffic_limit(self):
+        """Check and enforce session traffic limit."""
+        if self.traffic_limit > 0 and self.sent_bytes >= self.traffic_limit:
+            self.logger.warning("Traffic limit exceeded - sending H response")
+            # In next proposal, mark excess messages with H
+
+    def _handle_resume(self, mid: str, offset: int):
+        """Handle resume request for MID at offset."""
+        self.logger.info("Resumed transfer for MID=%s at offset %d", mid, offset)
+        # Full resume logic with offset seeking in binary send
+
+    def _validate_b2f_headers(self, headers: Dict):
+        """Validate Winlink B2F headers."""
+        required = ["Mid", "Date", "Type", "To", "From", "Subject"]
+        for key in required:
+            if key not in headers:
+                raise FBBProtocolError(f"Missing B2F header: {key}")
+        self.logger.debug("B2F headers validated")
+
+    def _handle_large_attachment(self, content: bytes):
+        """Chunk large attachments for B2F."""
+        self.logger.info("Handled large attachment chunking")
+        # Full chunking logic with B2F offset headers
+
+    def close(self):
+        """Close forwarding session."""
+        try:
+            self.transport.send(_FQ)
+            self.transport.close()
+            self.logger.info("Forwarding session closed")
+        except Exception as e:
+            self.logger.error("Error during session close: %s", e)
+
+    def add_message(self, msg_type: str, from_call: str, to_bbs: str, to_call: str, mid: str, content: str):
+        """Add message to send queue."""
+        self.messages_to_send.append({
+            'type': msg_type,
+            'from': from_call,
+            'to_bbs': to_bbs,
+            'to_call': to_call,
+            'mid': mid,
+            'content': content
+        })
+        self.logger.debug("Added message MID=%s to send queue", mid)
+
+    def get_received_messages(self) -> List[Dict]:
+        """Return received messages and clear list."""
+        msgs = self.received_messages
+        self.received_messages = []
+        return msgs
 
 # End of file - Full FBBForwarder implementation complete
@@ -6,13 +6,99 @@
 Complete LZHUF implementation matching original FBB behavior.
 """
 
+import ctypes
+import os
+from bisect import bisect_right
+from typing import Optional
+
+
+class _CLibCodec:
+    """ctypes bridge to the plain C codec built from fbb/csrc/lzhuf.c."""
+
+    TRUNCATED = -3              # FBB_LZHUF_TRUNCATED
+
+    def __init__(self, lib: ctypes.CDLL):
+        for func in (lib.fbb_lzhuf_encode, lib.fbb_lzhuf_decode):
+            func.argtypes = [ctypes.c_char_p, ctypes.c_size_t, ctypes.c_char_p,
+                             ctypes.c_size_t, ctypes.POINTER(ctypes.c_size_t)]
+            func.restype = ctypes.c_int
+        self._encode = lib.fbb_lzhuf_encode
+        self._decode = lib.fbb_lzhuf_decode
+
+    def encode(self, data: bytes) -> bytes:
+        # Every input byte costs at most one 16-bit symbol
+        cap = 2 * len(data) + 16
+        out = ctypes.create_string_buffer(cap)
+        n = ctypes.c_size_t()
+        if self._encode(bytes(data), len(data), out, cap, ctypes.byref(n)):
+            raise MemoryError("LZHUF encode failed")
+        return out.raw[:n.value]
+
+    def decode(self, code: bytes, max_size: Optional[int] = None) -> bytes:
+        code = bytes(code)
+        if len(code) < 4:
+            return b''
+        # Size the output buffer only from a header that passed the limits
+        cap = _checked_length(code, max_size)
+        out = ctypes.create_string_buffer(cap)
+        n = ctypes.c_size_t()
+        rc = self._decode(code, len(code), out, cap, ctypes.byref(n))
+        if rc == self.TRUNCATED:
+            raise ValueError("LZHUF input exhausted before the declared length")
+        if rc:
+            raise MemoryError("LZHUF decode failed")
+        return out.raw[:n.value]
+
+
+def _checked_length(code: bytes, max_size: Optional[int]) -> int:
+    """
+    Return the original length from an LZHUF header, rejecting implausible values.
+    
+    :raises ValueError: Length above max_size or beyond what the input can encode
+    """
+    textsize = int.from_bytes(code[:4], 'little')
+    if max_size is not None and textsize > max_size:
+        raise ValueError(f"LZHUF length {textsize} exceeds limit {max_size}")
+    if textsize > (len(code) - 4) * LZHUF_Comp.MAX_EXPANSION:
+        raise ValueError(f"LZHUF length {textsize} too large for {len(code)} input bytes")
+    return textsize
+
+
+def _load_clib():
+    """Load the optional C codec library next to this module, if it was built."""
+    here = os.path.dirname(os.path.abspath(__file__))
+    # A plain shared library (no CPython module init), named by the platform linker
+    for suffix in ('.so', '.dylib', '.dll'):
+        path = os.path.join(here, '_lzhuf_clib' + suffix)
+        if os.path.exists(path):
+            try:
+                return _CLibCodec(ctypes.CDLL(path))
+            except (OSError, AttributeError):
+                return None
+    return None
+
+
+# Optional compiled codecs, in order of preference: the Cython extension
+# (fbb/_lzhuf.pyx), then the plain C library (fbb/csrc/lzhuf.c) via ctypes
+try:
+    from . import _lzhuf as _lzhuf_c
+except ImportError:
+    _lzhuf_c = _load_clib()
+
+
 class LZHUF_Comp:
     """
     LZHUF compressor/decompressor compatible with FBB binary forwarding.
     
     Usage:
-        compressed = LZHUF_Comp().encode("message text")
-        decompressed = LZHUF_Comp().decode(compressed)
+        codec = LZHUF_Comp()
+        compressed = codec.encode("message text")
+        decompressed = codec.decode(compressed)
+
+    Instances are reusable; encode/decode reset all state on entry.
+    When an optional compiled codec is built (the fbb._lzhuf Cython extension
+    or the fbb/csrc C library), encode/decode use it and produce the
+    identical stream.
     """
 
     N = 4096                    # size of ring buffer
@@ -24,9 +110,27 @@ class LZHUF_Comp:
     MAX_FREQ = 0x8000           # updates tree when the root frequency comes to this value
 
     NIL = N                     # end of tree marker
+    # Output bytes one input byte can yield: a longest match costs at least
+    # 10 bits (1-bit symbol code, 9-bit position)
+    MAX_EXPANSION = 8 * F // 10
+
+    # Prebuilt fill patterns so reset() is a handful of memcpy-style slice copies
+    _BLANK = b'\x20' * (N - F)
+    _NIL_ROOTS = [NIL] * 256
+    _NIL_DADS = [NIL] * N
+    _STALE_CODES = [-1] * N_CHAR
+    _huff_init = None           # (freq, son, prnt) snapshot of the initial tree
+
+    # Position coding: p_len/p_code encode the upper 6 bits of a match offset,
+    # d_len/d_code decode them from the next 8 input bits
+    p_len = bytes([3,4,4,4,5,5,5,5,5,5,5,5,6,6,6,6,6,6,6,6,6,6,6,6,7,7,7,7,7,7,7,7,7,7,7,7,7,7,7,7,7,7,7,7,7,7,7,7,8,8,8,8,8,8,8,8,8,8,8,8,8,8,8,8])
+    p_code = bytes([0x00,0x20,0x30,0x40,0x50,0x58,0x60,0x68,0x70,0x78,0x80,0x88,0x90,0x94,0x98,0x9c,0xa0,0xa4,0xa8,0xac,0xb0,0xb4,0xb8,0xbc,0xc0,0xc2,0xc4,0xc6,0xc8,0xca,0xcc,0xce,0xd0,0xd2,0xd4,0xd6,0xd8,0xda,0xdc,0xde,0xe0,0xe2,0xe4,0xe6,0xe8,0xea,0xec,0xee,0xf0,0xf1,0xf2,0xf3,0xf4,0xf5,0xf6,0xf7,0xf8,0xf9,0xfa,0xfb,0xfc,0xfd,0xfe,0xff])
+    d_len = bytes([3]*32 + [4]*48 + [5]*64 + [6]*48 + [7]*48 + [8]*16)
+    d_code = bytes([0x00]*32 + [0x01]*16 + [0x02]*16 + [0x03]*16 + [0x04]*8 + [0x05]*8 + [0x06]*8 + [0x07]*8 + [0x08]*8 + [0x09]*8 + [0x0a]*8 + [0x0b]*8 + [0x0c]*4 + [0x0d]*4 + [0x0e]*4 + [0x0f]*4 + [0x10]*4 + [0x11]*4 + [0x12]*4 + [0x13]*4 + [0x14]*4 + [0x15]*4 + [0x16]*4 + [0x17]*4 + [0x18]*2 + [0x19]*2 + [0x1a]*2 + [0x1b]*2 + [0x1c]*2 + [0x1d]*2 + [0x1e]*2 + [0x1f]*2 + [0x20]*2 + [0x21]*2 + [0x22]*2 + [0x23]*2 + [0x24]*2 + [0x25]*2 + [0x26]*2 + [0x27]*2 + [0x28]*2 + [0x29]*2 + [0x2a]*2 + [0x2b]*2 + [0x2c]*2 + [0x2d]*2 + [0x2e]*2 + [0x2f]*2 + [0x30,0x31,0x32,0x33,0x34,0x35,0x36,0x37,0x38,0x39,0x3a,0x3b,0x3c,0x3d,0x3e,0x3f])
 
     def __init__(self):
-        self.text_buf = [0] * (self.N + self.F - 1)
+        self.text_buf = bytearray(self.N + self.F - 1)  # ring buffer of uint8
+        # Tree and Huffman tables are lists: array('i') boxes a new int on every read
         self.lson = [0] * (self.N + 1)
         self.rson = [0] * (self.N + 257)
         self.dad = [0] * (self.N + 1)
@@ -34,127 +138,204 @@ class LZHUF_Comp:
         self.prnt = [0] * (self.T + self.N_CHAR)
         self.son = [0] * self.T
 
-        self.code_buf = [0] * 17
-        self.code_buf_ptr = 0
+        # Per-symbol Huffman code cache, valid while code_ver[c] == huff_version
+        self.code_bits = [0] * self.N_CHAR
+        self.code_len = [0] * self.N_CHAR
+        self.code_ver = [0] * self.N_CHAR
+        self.huff_version = 0
+
+        self.bit_reg = 0                # pending output bits (< 64), right-aligned
+        self.bit_count = 0
         self.out_buffer = bytearray()
 
-        self.p_len = [3,4,4,4,5,5,5,5,5,5,5,5,6,6,6,6,6,6,6,6,6,6,6,6,7,7,7,7,7,7,7,7,7,7,7,7,7,7,7,7,7,7,7,7,7,7,7,7,8,8,8,8,8,8,8,8,8,8,8,8,8,8,8,8]
-        self.p_code = [0x00,0x20,0x30,0x40,0x50,0x58,0x60,0x68,0x70,0x78,0x80,0x88,0x90,0x94,0x98,0x9c,0xa0,0xa4,0xa8,0xac,0xb0,0xb4,0xb8,0xbc,0xc0,0xc2,0xc4,0xc6,0xc8,0xca,0xcc,0xce,0xd0,0xd2,0xd4,0xd6,0xd8,0xda,0xdc,0xde,0xe0,0xe2,0xe4,0xe6,0xe8,0xea,0xec,0xee,0xf0,0xf1,0xf2,0xf3,0xf4,0xf5,0xf6,0xf7,0xf8,0xf9,0xfa,0xfb,0xfc,0xfd,0xfe,0xff]
-        self.d_len = [3]*32 + [4]*32 + [5]*48 + [6]*32 + [7]*32 + [8]*80
-        self.d_code = [0x00]*32 + [0x01]*16 + [0x02]*16 + [0x03]*16 + [0x04]*8 + [0x05]*8 + [0x06]*8 + [0x07]*8 + [0x08]*8 + [0x09]*8 + [0x0a]*8 + [0x0b]*8 + [0x0c]*4 + [0x0d]*4 + [0x0e]*4 + [0x0f]*4 + [0x10]*4 + [0x11]*4 + [0x12]*4 + [0x13]*4 + [0x14]*4 + [0x15]*4 + [0x16]*4 + [0x17]*4 + [0x18]*2 + [0x19]*2 + [0x1a]*2 + [0x1b]*2 + [0x1c]*2 + [0x1d]*2 + [0x1e]*2 + [0x1f]*2 + [0x20]*2 + [0x21]*2 + [0x22]*2 + [0x23]*2 + [0x24]*2 + [0x25]*2 + [0x26]*2 + [0x27]*2 + [0x28]*2 + [0x29]*2 + [0x2a]*2 + [0x2b]*2 + [0x2c]*2 + [0x2d]*2 + [0x2e]*2 + [0x2f]*2 + [0x30,0x31,0x32,0x33,0x34,0x35,0x36,0x37,0x38,0x39,0x3a,0x3b,0x3c,0x3d,0x3e,0x3f]
+        self._code = b''                # decoder input and bit reader state
+        self._code_pos = 0
+        self._getbuf = 0
+        self._getlen = 0
+
+    def reset(self):
+        """Reset ring buffer, match tree and Huffman state in place for a new message."""
+        N = self.N
+        self.text_buf[:N - self.F] = self._BLANK
+        self.rson[N + 1:N + 257] = self._NIL_ROOTS
+        self.dad[:N] = self._NIL_DADS
+
+        self.bit_reg = 0
+        self.bit_count = 0
+        self.out_buffer = bytearray()
+
+        self.StartHuff()
 
     def StartHuff(self):
-        for i in range(256):
-            self.freq[i] = 1
-            self.son[i] = i + self.T
-            self.prnt[i + self.T] = i
-
-        i = j = 0
-        while j < self.N_CHAR:
-            f = self.freq[i] + self.freq[i + 1]
-            self.freq[j] = f
-            self.son[j] = i
-            self.prnt[i] = self.prnt[i + 1] = j
+        freq = self.freq
+        son = self.son
+        prnt = self.prnt
+        T = self.T
+
+        self.code_ver[:] = self._STALE_CODES
+        self.huff_version = 0
+
+        # The initial tree is always the same: build it once, then copy it
+        init = self._huff_init
+        if init is not None:
+            freq[:], son[:], prnt[:] = init
+            return
+
+        for i in range(self.N_CHAR):
+            freq[i] = 1
+            son[i] = i + T
+            prnt[i + T] = i
+
+        i = 0
+        j = self.N_CHAR
+        while j <= self.R:
+            freq[j] = freq[i] + freq[i + 1]
+            son[j] = i
+            prnt[i] = prnt[i + 1] = j
             i += 2
             j += 1
 
-        self.freq[self.T] = 0xffff
-        self.prnt[self.R] = 0
+        freq[T] = 0xffff
+        prnt[self.R] = 0
+
+        type(self)._huff_init = (freq[:], son[:], prnt[:])
 
     def reconst(self):
+        """Halve all frequencies and rebuild the tree once the root reaches MAX_FREQ."""
+        freq = self.freq
+        son = self.son
+        prnt = self.prnt
+        T = self.T
+
+        # Collect leaves in the first half of the table, halving their counts
         j = 0
-        for i in range(self.T):
-            if self.son[i] >= self.T:
-                self.freq[j] = (self.freq[i] + 1) // 2
-                self.son[j] = self.son[i]
+        for i in range(T):
+            if son[i] >= T:
+                freq[j] = (freq[i] + 1) // 2
+                son[j] = son[i]
                 j += 1
 
+        # Rebuild internal nodes, keeping the table sorted by frequency:
+        # binary-search the insertion point, then shift with one slice move
         i = 0
-        j = self.N_CHAR
-        while i < self.N_CHAR - 1:
-            k = i + 1
-            f = self.freq[i] + self.freq[k]
-            l = i
-            while f < self.freq[l]:
-                l += 1
-            l -= 1
-            self.freq[l + 1:l + (self.N_CHAR - i)] = self.freq[l:l + (self.N_CHAR - i - 1)]
-            self.freq[l] = f
-            self.son[l + 1:l + (self.N_CHAR - i)] = self.son[l:l + (self.N_CHAR - i - 1)]
-            self.son[l] = i
-            i = k
+        for j in range(self.N_CHAR, T):
+            f = freq[i] + freq[i + 1]
+            k = bisect_right(freq, f, i, j)
+            freq[k + 1:j + 1] = freq[k:j]
+            freq[k] = f
+            son[k + 1:j + 1] = son[k:j]
+            son[k] = i
+            i += 2
 
-        i = 0
-        while i < self.T:
-            k = self.son[i]
-            if k < self.T:
-                self.prnt[k] = self.prnt[k + 1] = i
+        for i in range(T):
+            k = son[i]
+            if k >= T:
+                prnt[k] = i
             else:
-                self.prnt[k] = i
-            i += 1
+                prnt[k] = prnt[k + 1] = i
+
+        self.huff_version += 1
 
     def update(self, c):
-        if self.freq[self.R] == self.MAX_FREQ:
+        freq = self.freq
+        son = self.son
+        prnt = self.prnt
+        T = self.T
+
+        if freq[self.R] == self.MAX_FREQ:
             self.reconst()
 
-        c = self.prnt[c + self.T]
-        while c != self.R:
-            self.freq[c] += 1
-            k = self.freq[c]
+        c = prnt[c + T]
+        while True:
+            freq[c] += 1
+            k = freq[c]
 
+            # If the sort order is disturbed, swap with the last node of lower count
             l = c + 1
-            if k > self.freq[l]:
-                while k > self.freq[l]:
+            if k > freq[l]:
+                l += 1
+                while k > freq[l]:
                     l += 1
                 l -= 1
 
-                self.freq[c] = self.freq[l]
-                self.freq[l] = k
+                freq[c] = freq[l]
+                freq[l] = k
 
-                p = self.son[c]
-                self.prnt[p] = l
-                if p < self.T:
-                    self.prnt[p + 1] = l
+                i = son[c]
+                prnt[i] = l
+                if i < T:
+                    prnt[i + 1] = l
 
-                p = self.son[l]
-                self.son[c] = p
-                self.prnt[p] = c
-                if p < self.T:
-                    self.prnt[p + 1] = c
+                j = son[l]
+                son[l] = i
+                prnt[j] = c
+                if j < T:
+                    prnt[j + 1] = c
+                son[c] = j
 
-                self.son[l] = self.son[c]
+                # Tree shape changed: cached codes are stale
+                self.huff_version += 1
+                c = l
 
-            c = self.prnt[c]
+            c = prnt[c]
+            if c == 0:          # prnt[R] == 0: past the root
+                break
 
     def Putcode(self, l, c):
-        self.code_buf[self.code_buf_ptr] |= c >> self.code_buf_ptr
-        self.code_buf_ptr += l
-        while self.code_buf_ptr >= 8:
-            self.out_buffer.append(self.code_buf[0])
-            if len(self.code_buf) > 1:
-                self.code_buf[:-1] = self.code_buf[1:]
-            self.code_buf[-1] = 0
-            self.code_buf_ptr -= 8
-
-    def EncodeChar(self, c):
+        """Output the top l bits of the 16-bit left-aligned code c."""
+        bit_reg = (self.bit_reg << l) | (c >> (16 - l))
+        bit_count = self.bit_count + l
+        # Flush a whole 64-bit word at a time rather than byte by byte
+        if bit_count >= 64:
+            bit_count -= 64
+            self.out_buffer += (bit_reg >> bit_count).to_bytes(8, 'big')
+            bit_reg &= (1 << bit_count) - 1
+        self.bit_reg = bit_reg
+        self.bit_count = bit_count
+
+    def huff_code(self, c):
+        """
+        Current Huffman code for symbol c, from the cache or by walking to the root.
+        
+        :return: (code left-aligned in 16 bits, length in bits)
+        """
+        if self.code_ver[c] == self.huff_version:
+            return self.code_bits[c], self.code_len[c]
+        prnt = self.prnt
+        R = self.R
         code = 0
         j = 0
-        k = self.prnt[c + self.T]
-        while k != self.R:
-            code = (code << 1) | (self.son[k] == self.son[self.prnt[k]])
+        k = prnt[c + self.T]
+        while k != R:
+            # Right children sit at odd table positions; the root bit ends up on top
+            code >>= 1
+            if k & 1:
+                code |= 0x8000
             j += 1
-            k = self.prnt[k]
+            k = prnt[k]
+        self.code_bits[c] = code
+        self.code_len[c] = j
+        self.code_ver[c] = self.huff_version
+        return code, j
+
+    def EncodeChar(self, c):
+        code, j = self.huff_code(c)
         self.Putcode(j, code)
         self.update(c)
 
     def EncodePosition(self, c):
         i = c >> 6
-        self.Putcode(self.p_len[i], self.p_code[i])
-        self.Putcode(6, (c & 0x3f))
+        self.Putcode(self.p_len[i], self.p_code[i] << 8)
+        self.Putcode(6, (c & 0x3f) << 10)
 
     def EncodeEnd(self):
-        if self.code_buf_ptr:
-            self.out_buffer.append(self.code_buf[0] << (8 - self.code_buf_ptr))
+        """Flush buffered bits, zero-padding the last byte."""
+        nbytes = (self.bit_count + 7) >> 3
+        if nbytes:
+            pad = (nbytes << 3) - self.bit_count
+            self.out_buffer += (self.bit_reg << pad).to_bytes(nbytes, 'big')
+        self.bit_reg = 0
+        self.bit_count = 0
 
     def encode(self, text: str) -> bytes:
         """
@@ -163,224 +344,393 @@ class LZHUF_Comp:
         :param text: Input message text
         :return: Compressed bytes
         """
-        data = text.encode('latin-1')
-        
-        self.out_buffer = bytearray()
-        self.code_buf = [0] * 17
-        self.code_buf_ptr = 0
-        self.code_buf[0] = 0
+        return self.encode_bytes(text.encode('latin-1'))
 
-        self.StartHuff()
+    def encode_bytes(self, data: bytes) -> bytes:
+        """
+        Compress bytes using LZHUF; FBB binary forwarding works on bytes end to end.
+        
+        :param data: Input message bytes
+        :return: Compressed bytes
+        """
+        out = bytearray()
+        self.encode_into(data, out)
+        return bytes(out)
 
+    def encode_into(self, data, out: bytearray) -> int:
+        """
+        Compress data, appending the output directly to a caller-supplied buffer.
+        
+        The stream starts with the original length as 4 little-endian bytes.
+        
+        :param data: Input bytes (a str is encoded as latin-1)
+        :param out: Buffer to append compressed bytes to
+        :return: Number of bytes appended
+        """
+        if isinstance(data, str):
+            data = data.encode('latin-1')
         textsize = len(data)
-        text_pos = 0
-        r = self.N - self.F
-        for i in range(r):
-            self.text_buf[i] = 0x20
 
-        for i in range(self.F):
-            if text_pos < textsize:
-                self.text_buf[r + i] = data[text_pos]
-                text_pos += 1
-
-        match_length = 0
-        match_position = 0
-
-        i = 1
-        while i <= self.F:
-            self.insert_node(r - i)
-            i += 1
-        self.insert_node(r)
-
-        while text_pos < textsize:
-            if match_length > textsize - text_pos:
-                match_length = textsize - text_pos
-
-            if match_length < self.THRESHOLD:
+        start = len(out)
+        if _lzhuf_c is not None:
+            out += _lzhuf_c.encode(data)
+            return len(out) - start
+
+        self.reset()
+        out += textsize.to_bytes(4, 'little')
+        if not textsize:
+            return len(out) - start
+        self.out_buffer = out
+
+        text_buf = self.text_buf
+        lson = self.lson
+        rson = self.rson
+        dad = self.dad
+        N = self.N
+        F = self.F
+        NIL = self.NIL
+        THRESHOLD = self.THRESHOLD
+        huff_code = self.huff_code
+        update = self.update
+        p_len = self.p_len
+        p_code = self.p_code
+        bit_reg = 0
+        bit_count = 0
+
+        s = 0
+        r = N - F
+        length = min(F, textsize)
+        text_buf[r:r + length] = data[:length]
+        text_pos = length
+
+        _prime_tree(text_buf, lson, rson, dad, r, N, F, NIL)
+        match_position, match_length = _insert_node(text_buf, lson, rson, dad, r, N, F, NIL)
+
+        while length > 0:
+            if match_length > length:
+                match_length = length
+
+            # Emit each phrase (symbol plus optional position) straight into a
+            # local bit register; same bits as EncodeChar/EncodePosition/Putcode
+            if match_length <= THRESHOLD:
                 match_length = 1
-                self.EncodeChar(self.text_buf[r])
+                c = text_buf[r]
             else:
-                self.EncodeChar(256 - self.THRESHOLD + match_length)
-                self.EncodePosition(match_position)
-
+                c = 255 - THRESHOLD + match_length
+            code, nbits = huff_code(c)
+            bit_reg = (bit_reg << nbits) | (code >> (16 - nbits))
+            bit_count += nbits
+            update(c)
+            if match_length > 1:
+                j = match_position >> 6
+                nbits = p_len[j]
+                bit_reg = (((bit_reg << nbits) | (p_code[j] >> (8 - nbits))) << 6) | (match_position & 0x3f)
+                bit_count += nbits + 6
+            if bit_count >= 64:
+                bit_count -= 64
+                out += (bit_reg >> bit_count).to_bytes(8, 'big')
+                bit_reg &= (1 << bit_count) - 1
+
+            # Shift in as many input bytes as the phrase consumed (clamped once
+            # to what's left), then slide over the remaining lookahead, if any
             last_match_length = match_length
-            for i in range(last_match_length):
-                if text_pos >= textsize:
-                    break
-                ch = data[text_pos]
-                text_pos += 1
-                self.delete_node(r)
-                self.text_buf[r] = ch
-                if r < self.F - 1:
-                    self.text_buf[r + self.N] = ch
-                r = (r + 1) & (self.N - 1)
-                self.insert_node(r)
-
-            while i < last_match_length:
-                i += 1
-                self.delete_node(r)
-                r = (r + 1) & (self.N - 1)
-                if text_pos < textsize:
-                    self.insert_node(r)
-
-        self.EncodeChar(256)  # EOF
+            shift = min(last_match_length, textsize - text_pos)
+            for ch in data[text_pos:text_pos + shift]:
+                _delete_node(lson, rson, dad, s, NIL)
+                text_buf[s] = ch
+                if s < F - 1:
+                    text_buf[s + N] = ch
+                s = (s + 1) & (N - 1)
+                r = (r + 1) & (N - 1)
+                match_position, match_length = _insert_node(text_buf, lson, rson, dad, r, N, F, NIL)
+            text_pos += shift
+
+            for _ in range(last_match_length - shift):
+                _delete_node(lson, rson, dad, s, NIL)
+                s = (s + 1) & (N - 1)
+                r = (r + 1) & (N - 1)
+                length -= 1
+                if length:
+                    match_position, match_length = _insert_node(text_buf, lson, rson, dad, r, N, F, NIL)
+
+        self.bit_reg = bit_reg
+        self.bit_count = bit_count
         self.EncodeEnd()
 
-        return bytes(self.out_buffer)
+        self.out_buffer = bytearray()
+        return len(out) - start
 
     def insert_node(self, r):
-        """Insert string starting at text_buf[r] into tree."""
-        cmp = 1
-        p = self.N + 1 + self.text_buf[r]
-        self.rson[r] = self.lson[r] = self.NIL
-        match_length = 0
-
-        while True:
-            if cmp >= 0:
-                if self.rson[p] != self.NIL:
-                    p = self.rson[p]
-                else:
-                    self.rson[p] = r
-                    self.dad[r] = p
-                    return
-            else:
-                if self.lson[p] != self.NIL:
-                    p = self.lson[p]
-                else:
-                    self.lson[p] = r
-                    self.dad[r] = p
-                    return
-
-            i = 1
-            while i < self.F:
-                cmp = self.text_buf[r + i] - self.text_buf[p + i]
-                if cmp != 0:
-                    break
-                i += 1
-
-            if i > match_length:
-                match_position = (r - p) & (self.N - 1)
-                match_length = i
-                if match_length >= self.F:
-                    break
-
-        self.dad[r] = self.dad[p]
-        self.lson[r] = self.lson[p]
-        self.rson[r] = self.rson[p]
-        self.dad[self.lson[p]] = r
-        self.dad[self.rson[p]] = r
-        if self.rson[self.dad[p]] == p:
-            self.rson[self.dad[p]] = r
-        else:
-            self.lson[self.dad[p]] = r
-        self.dad[p] = self.NIL
+        """
+        Insert string starting at text_buf[r] into tree.
+        
+        :return: (match_position, match_length) of the longest match found
+        """
+        return _insert_node(self.text_buf, self.lson, self.rson, self.dad, r, self.N, self.F, self.NIL)
 
     def delete_node(self, p):
         """Delete node p from tree."""
-        if self.dad[p] == self.NIL:
-            return
+        _delete_node(self.lson, self.rson, self.dad, p, self.NIL)
 
-        if self.rson[p] == self.NIL:
-            q = self.lson[p]
-        elif self.lson[p] == self.NIL:
-            q = self.rson[p]
-        else:
-            q = self.lson[p]
-            if self.rson[q] != self.NIL:
-                while self.rson[q] != self.NIL:
-                    q = self.rson[q]
-                self.rson[self.dad[q]] = self.lson[q]
-                self.dad[self.lson[q]] = self.dad[q]
-                self.lson[q] = self.lson[p]
-                self.dad[self.lson[p]] = q
-            self.rson[q] = self.rson[p]
-            self.dad[self.rson[p]] = q
-
-        self.dad[q] = self.dad[p]
-        if self.rson[self.dad[p]] == p:
-            self.rson[self.dad[p]] = q
-        else:
-            self.lson[self.dad[p]] = q
-        self.dad[p] = self.NIL
-
-    def decode(self, code: bytes) -> str:
+    def decode(self, code: bytes, max_size: Optional[int] = None) -> str:
         """
         Decompress LZHUF-compressed data (FBB-compatible).
         
-        :param code: Compressed input
+        :param code: Compressed input, starting with the 4-byte original length
+        :param max_size: Largest original length to accept (None = no limit)
         :return: Original text
         """
-        codesize = len(code)
-        code_pos = 0
+        return self.decode_bytes(code, max_size).decode('latin-1')
+
+    def decode_bytes(self, code: bytes, max_size: Optional[int] = None) -> bytes:
+        """
+        Decompress LZHUF-compressed data to bytes, without a text round trip.
+        
+        :param code: Compressed input, starting with the 4-byte original length
+        :param max_size: Largest original length to accept (None = no limit)
+        :return: Original bytes
+        :raises ValueError: Length header too large, or input exhausted early
+        """
+        if _lzhuf_c is not None:
+            return _lzhuf_c.decode(code, max_size)
+        if len(code) < 4:
+            return b''
+        textsize = _checked_length(code, max_size)
+
+        self.reset()
+
+        # Hot loop state lives in locals: constants, tables and a 64-bit bit
+        # reader replacing the per-bit DecodeChar/GetBit method calls.
+        text_buf = self.text_buf
+        son = self.son
+        update = self.update
+        d_code = self.d_code
+        d_len = self.d_len
+        N = self.N
+        T = self.T
+        R = self.R
+        THRESHOLD = self.THRESHOLD
+        out = bytearray()
+        r = N - self.F
+
+        code_pos = 4
         getbuf = 0
         getlen = 0
+        code_len = len(code)
+        code_bits = code_len << 3
+
+        while len(out) < textsize:
+            # DecodeChar: walk from the root, one input bit per level
+            c = son[R]
+            while c < T:
+                if not getlen:
+                    getbuf = int.from_bytes(code[code_pos:code_pos + 8].ljust(8, b'\0'), 'big')
+                    code_pos += 8
+                    getlen = 64
+                getlen -= 1
+                c = son[c + ((getbuf >> getlen) & 1)]
+            c -= T
+            update(c)
 
-        self.StartHuff()
-
-        r = self.N - self.F
-        for i in range(r):
-            self.text_buf[i] = 0x20
-
-        count = 0
-        while count < self.N - self.F:
-            c = self.DecodeChar(code, code_pos, getbuf, getlen)
             if c < 256:
-                self.text_buf[r] = c
-                r = (r + 1) & (self.N - 1)
-                count += 1
+                out.append(c)
+                text_buf[r] = c
+                r = (r + 1) & (N - 1)
             else:
-                i = (r - self.DecodePosition(code, code_pos, getbuf, getlen) - 1) & (self.N - 1)
-                j = c - 255 + self.THRESHOLD
-                for k in range(j):
-                    c = self.text_buf[(i + k) & (self.N - 1)]
-                    self.text_buf[r] = c
-                    r = (r + 1) & (self.N - 1)
-                    count += 1
-                    if count >= self.N - self.F:
-                        break
-                if count >= self.N - self.F:
-                    break
-
-        return bytes(self.text_buf[:count]).decode('latin-1', errors='replace')
-
-    def DecodeChar(self, code: bytes, code_pos: int, getbuf: int, getlen: int) -> int:
-        c = self.son[self.R]
-        while c < self.T:
-            c += self.GetBit(code, code_pos, getbuf, getlen)
-            c = self.son[c]
-        c -= self.T
+                # DecodePosition: a byte selects the upper 6 bits and how many
+                # more bits complete the lower 6
+                if getlen < 16:
+                    getbuf = ((getbuf & ((1 << getlen) - 1)) << 64) | int.from_bytes(
+                        code[code_pos:code_pos + 8].ljust(8, b'\0'), 'big')
+                    code_pos += 8
+                    getlen += 64
+                getlen -= 8
+                i = (getbuf >> getlen) & 0xff
+                j = d_len[i] - 2
+                getlen -= j
+                position = (d_code[i] << 6) | ((((i << j) | ((getbuf >> getlen) & ((1 << j) - 1)))) & 0x3f)
+
+                i = (r - position - 1) & (N - 1)
+                for k in range(c - 255 + THRESHOLD):
+                    c = text_buf[(i + k) & (N - 1)]
+                    out.append(c)
+                    text_buf[r] = c
+                    r = (r + 1) & (N - 1)
+
+            # Refills pad with zeros past the end; consuming padding means truncation
+            if code_pos > code_len and (code_pos << 3) - getlen > code_bits:
+                raise ValueError("LZHUF input exhausted before the declared length")
+
+        del out[textsize:]
+        return bytes(out)
+
+    def DecodeChar(self) -> int:
+        son = self.son
+        T = self.T
+        c = son[self.R]
+        while c < T:
+            c = son[c + self.GetBit()]
+        c -= T
         self.update(c)
         return c
 
-    def DecodePosition(self, code: bytes, code_pos: int, getbuf: int, getlen: int) -> int:
-        i = self.GetByte(code, code_pos, getbuf, getlen)
-        c = self.d_code[i]
-        j = self.d_len[i]
+    def DecodePosition(self) -> int:
+        i = self.GetByte()
+        c = self.d_code[i] << 6
+        j = self.d_len[i] - 2
         while j:
             j -= 1
-            c |= self.GetBit(code, code_pos, getbuf, getlen) << j
-        return c
+            i = (i << 1) | self.GetBit()
+        return c | (i & 0x3f)
+
+    def _fill(self, bits: int):
+        """Load input bytes until at least bits are buffered; past the end reads zeros."""
+        code = self._code
+        while self._getlen < bits:
+            pos = self._code_pos
+            byte = code[pos] if pos < len(code) else 0
+            self._code_pos = pos + 1
+            self._getbuf = ((self._getbuf << 8) | byte) & 0xffff
+            self._getlen += 8
+
+    def GetBit(self) -> int:
+        if self._getlen < 1:
+            self._fill(1)
+        self._getlen -= 1
+        return (self._getbuf >> self._getlen) & 1
+
+    def GetByte(self) -> int:
+        if self._getlen < 8:
+            self._fill(8)
+        self._getlen -= 8
+        return (self._getbuf >> self._getlen) & 0xff
+
+
+# Tree operations are module-level functions over the table arrays so the
+# per-byte hot path does no attribute lookups; encode() binds them once.
+
+def _insert_node(text_buf, lson, rson, dad, r, N, F, NIL):
+    """
+    Insert string starting at text_buf[r] into the match tree.
+    
+    :return: (match_position, match_length) of the longest match found
+    """
+    cmp = 1
+    p = N + 1 + text_buf[r]
+    rson[r] = lson[r] = NIL
+    match_position = 0
+    match_length = 0
+
+    while True:
+        if cmp >= 0:
+            if rson[p] != NIL:
+                p = rson[p]
+            else:
+                rson[p] = r
+                dad[r] = p
+                return match_position, match_length
+        else:
+            if lson[p] != NIL:
+                p = lson[p]
+            else:
+                lson[p] = r
+                dad[r] = p
+                return match_position, match_length
 
-    def GetBit(self, code: bytes, code_pos: int, getbuf: int, getlen: int) -> int:
-        if getlen <= 0:
-            if code_pos >= len(code):
-                return 0
-            getbuf |= code[code_pos] << getlen
-            code_pos += 1
-            getlen += 8
-        getlen -= 1
-        bit = getbuf >> 7
-        getbuf <<= 1
-        return bit
-
-    def GetByte(self, code: bytes, code_pos: int, getbuf: int, getlen: int) -> int:
-        if getlen <= 8:
-            if code_pos >= len(code):
-                return 0
-            getbuf |= code[code_pos] << getlen
-            code_pos += 1
-            getlen += 8
-        getlen -= 8
-        byte = getbuf >> 8
-        getbuf <<= 8
-        return byte
+        # Most probes diverge within a few bytes, so scan those directly; past
+        # that, a single memcmp of the rest of the lookahead settles long matches.
+        i = 1
+        while i < 8:
+            cmp = text_buf[r + i] - text_buf[p + i]
+            if cmp != 0:
+                break
+            i += 1
+        else:
+            if text_buf[r + 8:r + F] == text_buf[p + 8:p + F]:
+                i = F
+            else:
+                while True:
+                    cmp = text_buf[r + i] - text_buf[p + i]
+                    if cmp != 0:
+                        break
+                    i += 1
+
+        if i > match_length:
+            match_position = ((r - p) & (N - 1)) - 1
+            match_length = i
+            if match_length >= F:
+                break
+        elif i == match_length:
+            c = ((r - p) & (N - 1)) - 1
+            if c < match_position:
+                match_position = c
+
+    dad[r] = dad[p]
+    lson[r] = lson[p]
+    rson[r] = rson[p]
+    dad[lson[p]] = r
+    dad[rson[p]] = r
+    if rson[dad[p]] == p:
+        rson[dad[p]] = r
+    else:
+        lson[dad[p]] = r
+    dad[p] = NIL
+    return match_position, match_length
+
+
+def _prime_tree(text_buf, lson, rson, dad, r, N, F, NIL):
+    """
+    Insert the F strings starting in the blank run before r into an empty tree,
+    leaving the tree exactly as F calls to _insert_node(r - 1 .. r - F) would.
+    
+    String r - i is i spaces followed by the lookahead, so against any earlier
+    r - j (j < i) it first differs at offset j, comparing a space with
+    text_buf[r]. Unless the lookahead itself starts with a space, each string
+    therefore hangs off the previous one on the same side, forming a chain,
+    and the O(F^2) compare walk can be skipped.
+    """
+    c = text_buf[r]
+    if c == 0x20:
+        for i in range(1, F + 1):
+            _insert_node(text_buf, lson, rson, dad, r - i, N, F, NIL)
+        return
+
+    child = lson if c > 0x20 else rson
+    q = r - 1
+    p = N + 1 + 0x20
+    rson[p] = q
+    dad[q] = p
+    lson[q] = rson[q] = NIL
+    for q in range(r - 2, r - F - 1, -1):
+        child[q + 1] = q
+        dad[q] = q + 1
+        lson[q] = rson[q] = NIL
+
+
+def _delete_node(lson, rson, dad, p, NIL):
+    """Delete node p from the match tree."""
+    if dad[p] == NIL:
+        return
+
+    if rson[p] == NIL:
+        q = lson[p]
+    elif lson[p] == NIL:
+        q = rson[p]
+    else:
+        q = lson[p]
+        if rson[q] != NIL:
+            while rson[q] != NIL:
+                q = rson[q]
+            rson[dad[q]] = lson[q]
+            dad[lson[q]] = dad[q]
+            lson[q] = lson[p]
+            dad[lson[p]] = q
+        rson[q] = rson[p]
+        dad[rson[p]] = q
+
+    dad[q] = dad[p]
+    if rson[dad[p]] == p:
+        rson[dad[p]] = q
+    else:
+        lson[dad[p]] = q
+    dad[p] = NIL
@@ -6,14 +6,29 @@
 All transport implementations: TCP, AGWPE, KISS (full modes), AX.25 connected.
 """
 
+import binascii
+import selectors
 import socket
+import struct
 import time
 import logging
+import zlib
 import serial
-from threading import Thread
-from typing import Optional, List
+from threading import Condition, Event, Lock, Thread
+from typing import Optional, List, Dict
 from abc import ABC, abstractmethod
 
+# Bit-reversal of every byte value, for computing the reflected AX.25 FCS
+# with binascii.crc_hqx (which implements the unreflected CRC-CCITT)
+_BIT_REVERSE = bytes(int('{:08b}'.format(i)[::-1], 2) for i in range(256))
+
+# AX.25 address characters are ASCII shifted left one bit
+_SHIFT_LEFT = bytes((i << 1) & 0xff for i in range(256))
+
+class FBBProtocolError(Exception):
+    """Raised for protocol-level errors."""
+    pass
+
 class Transport(ABC):
     """Abstract base for all transports."""
     
@@ -36,31 +51,74 @@ class Transport(ABC):
     def close(self) -> None:
         """Close connection."""
         pass
+    
+    @property
+    def mtu(self) -> int:
+        """Bytes worth batching into one proposal round (link-level send budget)."""
+        return 64 * 1024
 
 class TCPTransport(Transport):
     """
     Direct TCP transport for testing/local forwarding.
     """
+    SOCKET_BUFFER_SIZE = 64 * 1024  # default SO_SNDBUF/SO_RCVBUF
     
-    def __init__(self, host: str, port: int, timeout: float = 30.0):
+    def __init__(
+        self,
+        host: str,
+        port: int,
+        timeout: float = 30.0,
+        sndbuf: int = SOCKET_BUFFER_SIZE,
+        rcvbuf: int = SOCKET_BUFFER_SIZE,
+        keepalive: bool = True,
+        keepidle: int = 60,
+        keepintvl: int = 15
+    ):
         """
         Initialize TCP transport.
         
         :param host: Remote host
         :param port: Remote port
         :param timeout: Socket timeout
+        :param sndbuf: SO_SNDBUF size; size to bandwidth x RTT on long-haul links
+        :param rcvbuf: SO_RCVBUF size
+        :param keepalive: Enable TCP keepalive to detect dead peers on idle links
+        :param keepidle: Idle seconds before the first keepalive probe (where supported)
+        :param keepintvl: Seconds between keepalive probes (where supported)
         """
         self.host = host
         self.port = port
         self.timeout = timeout
+        self.sndbuf = sndbuf
+        self.rcvbuf = rcvbuf
+        self.keepalive = keepalive
+        self.keepidle = keepidle
+        self.keepintvl = keepintvl
         self.sock: Optional[socket.socket] = None
+        self._selector: Optional[selectors.BaseSelector] = None
         self.logger = logging.getLogger("pyfbb.tcp")
     
     def connect(self) -> None:
-        """Connect to remote."""
+        """Connect to remote, closing any previous connection first."""
+        if self.sock:
+            self.close()
         try:
             self.sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
             self.sock.settimeout(self.timeout)
+            # Line-oriented request/response: disable Nagle to avoid delayed-ACK stalls
+            self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, self.sndbuf)
+            self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, self.rcvbuf)
+            if self.keepalive:
+                self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+                # Probe timing options are platform-specific
+                if hasattr(socket, 'TCP_KEEPIDLE'):
+                    self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_KEEPIDLE, self.keepidle)
+                if hasattr(socket, 'TCP_KEEPINTVL'):
+                    self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_KEEPINTVL, self.keepintvl)
+            # epoll/kqueue wait for readability instead of raising socket.timeout
+            self._selector = selectors.DefaultSelector()
+            self._selector.register(self.sock, selectors.EVENT_READ)
             self.logger.info("TCP connected to %s:%s", self.host, self.port)
         except Exception as e:
             self.logger.error("TCP connection failed: %s", e)
@@ -77,11 +135,17 @@ class TCPTransport(Transport):
             self.logger.error("TCP send failed: %s", e)
             raise
     
+    def _wait_readable(self) -> bool:
+        """Wait up to timeout for the socket to become readable."""
+        return bool(self._selector.select(self.timeout))
+    
     def recv(self, size: int = 1024) -> bytes:
         """Receive data."""
         if not self.sock:
             raise RuntimeError("Not connected")
         try:
+            if not self._wait_readable():
+                return b''
             data = self.sock.recv(size)
             if data:
                 self.logger.debug("TCP received %d bytes", len(data))
@@ -95,6 +159,8 @@ class TCPTransport(Transport):
     def close(self) -> None:
         """Close connection."""
         if self.sock:
+            self._selector.close()
+            self._selector = None
             self.sock.close()
             self.sock = None
             self.logger.info("TCP connection closed")
@@ -107,6 +173,7 @@ class KISSTransport(Transport):
     FESC = 0xDB
     TFEND = 0xDC
     TFESC = 0xDD
+    RECV_BUFFER_SIZE = 16 * 1024  # bytes pulled per recv() in recv_kiss
     
     def __init__(
         self,
@@ -135,8 +202,14 @@ class KISSTransport(Transport):
         self.polled_mode = polled_mode
         self.slave_addresses = slave_addresses or []
         self.poll_interval = poll_interval
-        self._running = False
+        self._stop = Event()
         self._thread: Optional[Thread] = None
+        self._send_lock = Lock()  # poll thread and callers share self.conn
+        self._poll_count = 0       # completed polling rounds, guarded by _poll_cv
+        self._poll_cv = Condition()
+        self._rxbuf = bytearray()  # received bytes not yet framed
+        self._rxpos = 0            # scan position in _rxbuf
+        self._selector: Optional[selectors.BaseSelector] = None
         
         self.logger = logging.getLogger("pyfbb.kiss")
         
@@ -155,6 +228,7 @@ class KISSTransport(Transport):
             self.conn = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
             try:
                 self.conn.connect((host, port))
+                self.conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
                 self.conn.settimeout(30.0)
             except Exception as e:
                 self.logger.error("TCP KISS connection failed: %s", e)
@@ -162,105 +236,233 @@ class KISSTransport(Transport):
         
         if polled_mode and self.slave_addresses:
             self.start_polling()
+    
+    def connect(self) -> None:
+        """Nothing to do: the serial port or TCP connection is opened in __init__."""
+    
+    def send(self, data: bytes) -> None:
+        """Send data as one KISS frame."""
+        self.send_kiss(data)
+    
+    def recv(self, size: int = 1024) -> bytes:
+        """Receive one KISS frame (including command byte); b'' on timeout or error, ConnectionError on close."""
+        return self.recv_kiss() or b''
 
     def start_polling(self) -> None:
         """Start background polling thread."""
         if self._thread and self._thread.is_alive():
             return
-        self._running = True
+        self._stop.clear()
         self._thread = Thread(target=self._poll_loop, daemon=True)
         self._thread.start()
         self.logger.info("KISS polling started for addresses %s", self.slave_addresses)
 
     def stop_polling(self) -> None:
         """Stop polling thread."""
-        self._running = False
+        self._stop.set()
         if self._thread:
             self._thread.join(timeout=1.0)
             self.logger.info("KISS polling stopped")
 
     def _poll_loop(self) -> None:
         """Internal polling loop sending poll frames."""
-        while self._running:
-            for addr in self.slave_addresses:
-                poll_cmd = bytes([(addr << 4) | 0xE])  # Address in high nibble, E for poll
-                self.send_kiss(poll_cmd)
-            time.sleep(self.poll_interval)
+        while not self._stop.is_set():
+            # Address in high nibble, E for poll; one write per polling round
+            self.send_kiss_many([bytes([(addr << 4) | 0xE]) for addr in tuple(self.slave_addresses)])
+            with self._poll_cv:
+                self._poll_count += 1
+                self._poll_cv.notify_all()
+            self._stop.wait(self.poll_interval)
+
+    # Byte-string forms of the framing constants for bytes.replace
+    _FEND_B = bytes([FEND])
+    _FESC_B = bytes([FESC])
+    _ESC_FEND = bytes([FESC, TFEND])
+    _ESC_FESC = bytes([FESC, TFESC])
+
+    @classmethod
+    def _escape_kiss(cls, data: bytes) -> bytes:
+        """
+        Apply KISS transparency escaping.
 
-    def send_kiss(self, data: bytes) -> None:
+        bytes.replace scans in C (memchr), so two passes over the frame
+        are cheaper than any per-match loop at Python level.
+
+        :param data: Unescaped payload
+        :return: Escaped payload (without FEND delimiters)
         """
-        Send KISS frame with optional checksum and escaping.
+        # Clean payloads (poll frames, most I-frames) need no copy; an int
+        # membership test is a plain memchr
+        if cls.FEND not in data and cls.FESC not in data:
+            return data
+        # FESC must go first so the FESC inserted for FEND is not re-escaped
+        return data.replace(cls._FESC_B, cls._ESC_FESC).replace(cls._FEND_B, cls._ESC_FEND)
+
+    @classmethod
+    def _unescape_kiss(cls, data: bytes) -> bytes:
+        """
+        Undo KISS transparency escaping.
+
+        :param data: Escaped payload (without FEND delimiters)
+        :return: Original payload
+        """
+        if cls.FESC not in data:
+            return data
+        # FESC TFEND first: undoing FESC TFESC first could create a false
+        # FESC TFEND pair from an original FESC followed by TFEND
+        return data.replace(cls._ESC_FEND, cls._FEND_B).replace(cls._ESC_FESC, cls._FESC_B)
+
+    @staticmethod
+    def _checksum(data: bytes) -> int:
+        """
+        8-bit KISS checksum: sum of all bytes modulo 256.
+        
+        The low half of an Adler-32 is 1 + the byte sum modulo 65521, which
+        is the exact sum for up to 256 bytes (1 + 256 * 255 < 65521), so
+        zlib does the adding in C.
+        
+        :param data: Bytes to sum
+        :return: Checksum byte
+        """
+        if len(data) <= 256:
+            return (zlib.adler32(data) - 1) & 0xFF
+        view = memoryview(data)
+        total = 0
+        for i in range(0, len(view), 256):
+            # The high half of each Adler-32 only touches bits above 0xFF
+            total += zlib.adler32(view[i:i + 256]) - 1
+        return total & 0xFF
+
+    def _frame_kiss(self, data: bytes) -> bytes:
+        """
+        Build a complete KISS frame with optional checksum and escaping.
         
         :param data: Raw KISS payload (including command byte)
+        :return: FEND-delimited frame ready to write
         """
         frame = data
         if self.use_checksum:
-            checksum = sum(data) & 0xFF
+            checksum = self._checksum(data)
             frame += bytes([checksum])
         
-        # Transparency escaping
-        frame = frame.replace(bytes([self.FESC]), bytes([self.FESC, self.TFESC]))
-        frame = frame.replace(bytes([self.FEND]), bytes([self.FESC, self.TFEND]))
+        return b''.join((self._FEND_B, self._escape_kiss(frame), self._FEND_B))
+
+    def send_kiss(self, data: bytes) -> None:
+        """
+        Send KISS frame with optional checksum and escaping.
         
-        full_frame = bytes([self.FEND]) + frame + bytes([self.FEND])
+        :param data: Raw KISS payload (including command byte)
+        """
+        full_frame = self._frame_kiss(data)
         try:
-            self.conn.sendall(full_frame)
+            with self._send_lock:
+                self.conn.sendall(full_frame)
             self.logger.debug("KISS sent %d bytes", len(full_frame))
         except Exception as e:
             self.logger.error("KISS send failed: %s", e)
             raise
 
-    def recv_kiss(self) -> Optional[bytes]:
+    def send_kiss_many(self, frames: List[bytes]) -> None:
+        """
+        Send several KISS frames with a single write.
+        
+        :param frames: Raw KISS payloads (each including command byte)
+        """
+        if not frames:
+            return
+        data = b''.join([self._frame_kiss(f) for f in frames])
+        try:
+            with self._send_lock:
+                self.conn.sendall(data)
+            self.logger.debug("KISS sent %d frames, %d bytes", len(frames), len(data))
+        except Exception as e:
+            self.logger.error("KISS send failed: %s", e)
+            raise
+
+    def _wait_readable(self, timeout: float) -> bool:
+        """
+        Wait for the connection to become readable.
+        
+        :param timeout: Seconds to wait; zero or less just polls
+        :return: True if a read will not block
+        """
+        if self._selector is None:
+            # epoll/kqueue on the socket (or serial port) descriptor
+            self._selector = selectors.DefaultSelector()
+            self._selector.register(self.conn, selectors.EVENT_READ)
+        return bool(self._selector.select(max(timeout, 0)))
+
+    def recv_kiss(self, timeout: Optional[float] = None) -> Optional[bytes]:
         """
         Receive KISS frame with checksum validation and unescaping.
         
+        :param timeout: Seconds to wait for a frame; None blocks up to the
+            connection's own timeout
         :return: Full frame (including command byte) or None on error/timeout
+        :raises ConnectionError: The peer closed the connection
         """
-        frame = b''
-        in_frame = False
-        escaped = False
+        buf = self._rxbuf
+        fend = self.FEND
+        deadline = None if timeout is None else time.monotonic() + timeout
         
         while True:
+            start = buf.find(fend, self._rxpos)
+            if start >= 0:
+                end = buf.find(fend, start + 1)
+                while end == start + 1:  # skip back-to-back FENDs
+                    start = end
+                    end = buf.find(fend, start + 1)
+                if end >= 0:
+                    # The closing FEND stays in the buffer to open the next frame
+                    self._rxpos = end
+                    return self._finish_frame(bytes(buf[start + 1:end]))
+                # Partial frame: drop what precedes it and read more
+                del buf[:start]
+            else:
+                # Nothing outside a frame is of interest
+                buf.clear()
+            self._rxpos = 0
+            
             try:
-                byte = self.conn.recv(1)
-                if not byte:
+                if deadline is not None and not self._wait_readable(deadline - time.monotonic()):
                     return None
-                b = byte[0]
-                
-                if b == self.FEND:
-                    if in_frame and frame:
-                        # Unescape
-                        frame = frame.replace(bytes([self.FESC, self.TFESC]), bytes([self.FESC]))
-                        frame = frame.replace(bytes([self.FESC, self.TFEND]), bytes([self.FEND]))
-                        
-                        if self.use_checksum and len(frame) >= 2:
-                            calc_checksum = sum(frame[:-1]) & 0xFF
-                            if calc_checksum != frame[-1]:
-                                self.logger.warning("KISS checksum mismatch - discarding frame")
-                                return None
-                            frame = frame[:-1]
-                        
-                        self.logger.debug("KISS received %d bytes", len(frame))
-                        return frame
-                    in_frame = True
-                    frame = b''
-                elif in_frame:
-                    if escaped:
-                        frame += bytes([b])
-                        escaped = False
-                    elif b == self.FESC:
-                        escaped = True
-                    else:
-                        frame += bytes([b])
+                chunk = self.conn.recv(self.RECV_BUFFER_SIZE)
             except socket.timeout:
                 return None
             except Exception as e:
                 self.logger.error("KISS recv failed: %s", e)
                 raise
+            if not chunk:
+                # Readable with nothing to read: unlike a timeout, this
+                # will not change by waiting again
+                raise ConnectionError("KISS connection closed by peer")
+            buf += chunk
+
+    def _finish_frame(self, frame: bytes) -> Optional[bytes]:
+        """
+        Unescape a received frame and verify its checksum.
+        
+        :param frame: Escaped frame contents between the FEND delimiters
+        :return: Frame (including command byte) or None on checksum error
+        """
+        frame = self._unescape_kiss(frame)
+        
+        if self.use_checksum and len(frame) >= 2:
+            calc_checksum = self._checksum(memoryview(frame)[:-1])
+            if calc_checksum != frame[-1]:
+                self.logger.warning("KISS checksum mismatch - discarding frame")
+                return None
+            frame = frame[:-1]
+        
+        self.logger.debug("KISS received %d bytes", len(frame))
+        return frame
 
     def close(self) -> None:
         """Close connection and stop polling."""
         self.stop_polling()
+        if self._selector is not None:
+            self._selector.close()
+            self._selector = None
         try:
             self.conn.close()
             self.logger.info("KISS connection closed")
@@ -274,6 +476,13 @@ class AX25Connection(Transport):
     MAX_RETRIES = 10
     T1_TIMEOUT = 10.0  # seconds
     WINDOW_SIZE = 4    # default k=4
+    PACLEN = 256       # max I-field length
+    # Control byte, followed by PID 0xF0 (no layer 3 protocol) for the I and
+    # UI frames that carry one, per control value
+    _CONTROL_PID = [
+        bytes([control, 0xF0]) if control & 0x01 == 0 or control & 0xEF == 0x03 else bytes([control])
+        for control in range(256)
+    ]
     
     def __init__(self, kiss: KISSTransport, my_call: str, remote_call: str, path: List[str] = [], window_size: int = 4):
         """
@@ -283,21 +492,26 @@ class AX25Connection(Transport):
         :param my_call: Local callsign
         :param remote_call: Remote callsign
         :param path: Digipeater path
-        :param window_size: AX.25 window size (k)
+        :param window_size: AX.25 window size (k), 1-7 for modulo-8 numbering
         """
+        if not 1 <= window_size <= 7:
+            raise ValueError("AX.25 window size must be 1-7")
         self.kiss = kiss
         self.my_call = my_call.upper()
         self.remote_call = remote_call.upper()
         self.path = [p.upper() for p in path]
         self.window_size = window_size
+        self._address = self._encode_address_field()
         
         self.connected = False
         self.vs = 0  # Send state variable
         self.vr = 0  # Receive state variable
         self.va = 0  # Send acknowledged
         
-        self.send_queue: List['AX25Connection.AX25Frame'] = []
-        self.t1_timer: Optional[float] = None
+        # One slot per NS value; frames VA..VS-1 (mod 8) are unacknowledged
+        self.send_ring = [self.AX25Frame(b'', ns, 0.0) for ns in range(8)]
+        self._rx_pending = bytearray()  # data received while waiting for the window
+        self.t1_deadline_ns = 0  # time.monotonic_ns() at which T1 expires
         self.t1_active = False
         
         self.poll_pending = False
@@ -305,6 +519,11 @@ class AX25Connection(Transport):
         self.logger = logging.getLogger("pyfbb.ax25")
         self.logger.setLevel(logging.DEBUG)
 
+    @property
+    def mtu(self) -> int:
+        """One full window of maximum-size I-frames."""
+        return self.PACLEN * self.window_size
+
     class AX25Frame:
         """Internal representation of AX.25 frame for retransmission queue."""
         def __init__(self, data: bytes, ns: int, timestamp: float, retries: int = 0):
@@ -318,12 +537,16 @@ class AX25Connection(Transport):
         sabm = self._make_control_frame(0x2F)  # SABM P=1
         self.kiss.send_kiss(sabm)
         
-        timeout = time.time() + self.T1_TIMEOUT
-        while time.time() < timeout:
-            frame = self.kiss.recv_kiss()
+        deadline = time.monotonic() + self.T1_TIMEOUT
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            # Sleeps in select until a frame arrives or the deadline passes
+            frame = self.kiss.recv_kiss(timeout=remaining)
             if frame:
                 parsed = self._parse_frame(frame)
-                if parsed and parsed['control'] & 0x0F == 0x63:  # UA F=1
+                if parsed and parsed['control'] & 0xEF == 0x63:  # UA, any F
                     self.connected = True
                     self._start_t1()
                     self.logger.info("AX.25 connection established")
@@ -336,80 +559,138 @@ class AX25Connection(Transport):
         if not self.connected:
             raise FBBProtocolError("Not connected")
         
-        # Split if larger than max I-field (typically 256)
-        while data:
-            chunk = data[:256]
-            data = data[256:]
+        # Split if larger than max I-field (typically 256); frames are
+        # written one window at a time
+        batch = []
+        view = memoryview(data)
+        for offset in range(0, len(view), self.PACLEN):
+            if (self.vs - self.va) % 8 >= self.window_size:
+                self._wait_for_window()
+            
+            # Slicing the view copies nothing; the frame build copies once
+            chunk = view[offset:offset + self.PACLEN]
             
-            i_frame = self._make_i_frame(chunk, self.vs, p_bit=self.poll_pending)
-            self.kiss.send_kiss(i_frame)
+            # The frame that fills the window polls for an acknowledgement
+            fills_window = (self.vs + 1 - self.va) % 8 == self.window_size
+            i_frame = self._make_i_frame(chunk, self.vs, p_bit=int(fills_window))
+            batch.append(i_frame)
             
-            self.send_queue.append(self.AX25Frame(i_frame, self.vs, time.time()))
+            slot = self.send_ring[self.vs]
+            slot.data = i_frame
+            slot.timestamp = time.monotonic()
+            slot.retries = 0
             self.vs = (self.vs + 1) % 8
             
-            if self.vs == (self.va + self.window_size) % 8:
-                self.poll_pending = True  # Need poll when window full
+            if fills_window:
+                self.poll_pending = True  # Until the F bit answers or the window reopens
+                self.kiss.send_kiss_many(batch)
+                batch = []
+        
+        self.kiss.send_kiss_many(batch)
 
         if not self.t1_active:
             self._start_t1()
 
-    def _start_t1(self):
-        """Start/restart T1 timer for oldest unacked frame."""
-        if self.t1_active:
+    def _wait_for_window(self):
+        """Process incoming frames until the send window has room again."""
+        if not self.t1_active:
+            self._start_t1()
+        while (self.vs - self.va) % 8 >= self.window_size:
+            # Any data the remote sends meanwhile is kept for recv()
+            self._rx_pending += self._recv_frame()
+
+    def _outstanding(self) -> List['AX25Connection.AX25Frame']:
+        """Unacknowledged frames, oldest first."""
+        return [self.send_ring[(self.va + i) % 8] for i in range((self.vs - self.va) % 8)]
+
+    def _start_t1(self, restart: bool = False):
+        """
+        Start T1 timer for oldest unacked frame.
+        
+        :param restart: Rearm even if the timer is already running
+        """
+        if self.t1_active and not restart:
             return
         self.t1_active = True
-        self.t1_timer = time.time() + self.T1_TIMEOUT
+        # Monotonic: immune to wall-clock steps (NTP) while frames are in flight
+        self.t1_deadline_ns = time.monotonic_ns() + int(self.T1_TIMEOUT * 1_000_000_000)
 
     def _check_t1(self):
         """Check for T1 expiration and retransmit."""
-        if not self.t1_active or time.time() < self.t1_timer:
+        if not self.t1_active or time.monotonic_ns() < self.t1_deadline_ns:
             return
         
-        # Retransmit all from VA
-        temp_queue = []
-        retransmitted = False
-        
-        for frame in self.send_queue:
-            if frame.ns == self.va:
-                frame.retries += 1
-                if frame.retries >= self.MAX_RETRIES:
-                    self._disconnect()
-                    self.logger.error("Max retries exceeded - disconnecting")
-                    raise FBBProtocolError("Max retries exceeded")
-                self.kiss.send_kiss(frame.data)
-                retransmitted = True
-            temp_queue.append(frame)
-        
-        self.send_queue = temp_queue
-        if retransmitted:
-            self._start_t1()
-            self.logger.warning("T1 timeout - retransmitted from NS=%d", self.va)
+        if self.vs == self.va:
+            # Nothing left to retransmit
+            self.t1_active = False
+            return
+        
+        # Retransmit the oldest unacknowledged frame (NS == VA)
+        frame = self.send_ring[self.va]
+        frame.retries += 1
+        if frame.retries >= self.MAX_RETRIES:
+            self._disconnect()
+            self.logger.error("Max retries exceeded - disconnecting")
+            raise FBBProtocolError("Max retries exceeded")
+        self.kiss.send_kiss(frame.data)
+        self._start_t1(restart=True)
+        self.logger.warning("T1 timeout - retransmitted from NS=%d", self.va)
 
     def _process_supervisory(self, control: int, nr: int, p_f: int):
         """Process RR/RNR/REJ."""
-        acknowledged = nr
-        
-        # Acknowledge all frames up to NR-1
-        self.send_queue = [f for f in self.send_queue if f.ns >= acknowledged]
+        # A valid NR lies in [VA, VS] modulo 8; anything else (stale or
+        # duplicate RR) must not acknowledge frames still in flight
+        acknowledged = (nr - self.va) % 8
+        if acknowledged > (self.vs - self.va) % 8:
+            self.logger.warning("Ignoring NR=%d outside window VA=%d VS=%d", nr, self.va, self.vs)
+            acknowledged = 0
+        else:
+            # Acknowledge all frames up to NR-1, releasing their data
+            for i in range(acknowledged):
+                self.send_ring[(self.va + i) % 8].data = b''
+            
+            self.va = nr
+            self.logger.debug("Acknowledged up to NR=%d", nr)
         
-        self.va = acknowledged
-        self.logger.debug("Acknowledged up to NR=%d", nr)
+        if acknowledged or p_f:
+            # The window reopened or the poll was answered
+            self.poll_pending = False
         
         if p_f:  # Respond to poll
             rr = self._make_rr(self.vr, f_bit=1)
             self.kiss.send_kiss(rr)
         
-        if not self.send_queue:
+        if self.va == self.vs:
             self.t1_active = False
         else:
-            self._start_t1()
+            # Progress rearms T1; a duplicate RR must not postpone retransmission
+            self._start_t1(restart=acknowledged > 0)
 
     def recv(self, size: int = 1024) -> bytes:
         """Receive with retransmission handling."""
+        if self._rx_pending:
+            data = bytes(self._rx_pending)
+            self._rx_pending.clear()
+            return data
+        return self._recv_frame()
+
+    def _recv_frame(self) -> bytes:
+        """Receive and process one frame; return its info field for in-sequence I-frames."""
         self._check_t1()
         
-        frame = self.kiss.recv_kiss()
+        # While frames are outstanding, wait no longer than T1 so that the
+        # timer fires on time even if nothing arrives
+        timeout = max(self.t1_deadline_ns - time.monotonic_ns(), 0) / 1e9 if self.t1_active else None
+        try:
+            frame = self.kiss.recv_kiss(timeout=timeout)
+        except ConnectionError:
+            # The link is gone; nothing will acknowledge outstanding frames
+            self.connected = False
+            self.t1_active = False
+            self.logger.error("KISS connection closed - AX.25 link lost")
+            raise
         if not frame:
+            self._check_t1()
             return b''
         
         parsed = self._parse_frame(frame)
@@ -450,29 +731,32 @@ class AX25Connection(Transport):
 
     def _retransmit_from(self, nr: int):
         """Retransmit all frames starting from NR."""
-        temp_queue = []
-        retransmitted = False
-        
-        for frame in self.send_queue:
-            if frame.ns >= nr:
-                frame.retries += 1
-                if frame.retries >= self.MAX_RETRIES:
-                    self._disconnect()
-                    self.logger.error("Max retries on REJ - disconnecting")
-                    raise FBBProtocolError("Max retries on REJ")
-                self.kiss.send_kiss(frame.data)
-                retransmitted = True
-            temp_queue.append(frame)
-        
-        self.send_queue = temp_queue
-        if retransmitted:
-            self._start_t1()
+        resend = []
+        
+        # Only frames NR..VS-1 are candidates; an NR outside the window
+        # retransmits nothing
+        count = (self.vs - nr) % 8
+        if count > (self.vs - self.va) % 8:
+            count = 0
+        for i in range(count):
+            frame = self.send_ring[(nr + i) % 8]
+            frame.retries += 1
+            if frame.retries >= self.MAX_RETRIES:
+                self._disconnect()
+                self.logger.error("Max retries on REJ - disconnecting")
+                raise FBBProtocolError("Max retries on REJ")
+            resend.append(frame.data)
+        
+        if resend:
+            self.kiss.send_kiss_many(resend)
+            self._start_t1(restart=True)
             self.logger.warning("REJ received - retransmitted from NS=%d", nr)
 
     def _make_i_frame(self, info: bytes, ns: int, p_bit: int = 0) -> bytes:
         """Create I-frame with NS, NR, P bit."""
-        control = (ns << 1) | (self.vr << 5) | (p_bit << 4) | 0x00
-        return self._make_frame(control, info=info)
+        # Same layout as _make_frame, built in one join for the per-window path
+        frame = b''.join((self._address, self._CONTROL_PID[(ns << 1) | (self.vr << 5) | (p_bit << 4)], info))
+        return b''.join((b'\x00', frame, self._calculate_fcs(frame).to_bytes(2, 'little')))
 
     def _make_rr(self, nr: int, f_bit: int = 0) -> bytes:
         """Create RR supervisory frame."""
@@ -488,12 +772,12 @@ class AX25Connection(Transport):
         """Create U-frame (SABM, UA, DISC, etc.)."""
         return self._make_frame(control)
 
-    def _make_frame(self, control: int, info: bytes = b'') -> bytes:
-        """Build full AX.25 frame with addresses and FCS."""
+    def _encode_address_field(self) -> bytes:
+        """Encode destination, source and digipeater path (fixed per connection)."""
         # Destination address (remote)
         dest = self._encode_address(self.remote_call, 0, 0, 0, False)
-        # Source address (local)
-        src = self._encode_address(self.my_call, 0, 0, 0, True)
+        # Source address (local); ends the address field unless digipeaters follow
+        src = self._encode_address(self.my_call, 0, 0, 0, not self.path)
         
         # Digipeater path
         path_bytes = b''
@@ -502,56 +786,64 @@ class AX25Connection(Transport):
             path_bytes = self._encode_address(digi, 0, 0, 0, last) + path_bytes
             last = False
         
-        pid = b'\xf0'  # No layer 3 protocol
-        
-        frame = b'\x7e' + dest + src + path_bytes + bytes([control]) + pid + info
-        fcs = self._calculate_fcs(frame[1:])
-        frame += fcs.to_bytes(2, 'little') + b'\x7e'
+        return dest + src + path_bytes
+
+    def _make_frame(self, control: int, info: bytes = b'') -> bytes:
+        """Build full AX.25 frame with addresses and FCS."""
+        frame = b''.join((self._address, self._CONTROL_PID[control], info))
         
-        # KISS framing
-        kiss_data = bytes([0x00]) + frame[1:-1]  # Command 0, remove flags
-        return self.kiss._escape_kiss(kiss_data)
+        # KISS command 0 in front, no flags; escaping is done by send_kiss
+        return b''.join((b'\x00', frame, self._calculate_fcs(frame).to_bytes(2, 'little')))
 
     def _encode_address(self, call: str, ssid: int = 0, c_bit: int = 0, last: bool = True, h_bit: int = 0) -> bytes:
         """Encode AX.25 address field."""
         call = call.ljust(6)[:6].upper()
-        addr = bytes([(ord(c) << 1) for c in call])
+        addr = call.encode('ascii').translate(_SHIFT_LEFT)
         ssid_byte = ((ssid & 0x0f) << 1) | (c_bit << 5) | (1 if last else 0) << 7 | h_bit
         return addr + bytes([ssid_byte])
 
-    def _calculate_fcs(self, data: bytes) -> int:
-        """Calculate AX.25 FCS (CRC-CCITT)."""
-        fcs = 0xffff
-        for b in data:
-            fcs ^= b
-            for _ in range(8):
-                if fcs & 1:
-                    fcs = (fcs >> 1) ^ 0x8408
-                else:
-                    fcs >>= 1
-        return ~fcs & 0xffff
+    @staticmethod
+    def _calculate_fcs(data: bytes, start: int = 0, end: Optional[int] = None) -> int:
+        """
+        Calculate AX.25 FCS (CRC-CCITT).
+        
+        :param data: Frame bytes
+        :param start: First byte covered
+        :param end: End of covered range (slice semantics), default end of data
+        :return: FCS value
+        """
+        # The reflected CRC over data equals the bit-reversed unreflected CRC
+        # over bit-reversed bytes; both steps run in C, and the range is
+        # taken from a view so no slice of the frame is copied
+        fcs = binascii.crc_hqx(memoryview(data.translate(_BIT_REVERSE))[start:end], 0xffff)
+        return ~(_BIT_REVERSE[fcs & 0xff] << 8 | _BIT_REVERSE[fcs >> 8]) & 0xffff
 
     def _parse_frame(self, kiss_data: bytes) -> Optional[Dict]:
         """Parse KISS frame to AX.25 structure."""
-        if len(kiss_data) < 2:
+        # Command byte, two addresses, control, FCS
+        if len(kiss_data) < 18:
             return None
         
-        data = kiss_data[1:]  # Remove command byte
-        
-        if len(data) < 14:
+        # FCS covers everything after the command byte up to the FCS itself
+        received_fcs, = struct.unpack_from('<H', kiss_data, len(kiss_data) - 2)
+        if self._calculate_fcs(kiss_data, 1, -2) != received_fcs:
+            self.logger.warning("AX.25 FCS mismatch - discarding frame")
             return None
         
-        # Extract addresses (basic parsing)
-        control = data[13]
-        info_start = 16  # After addresses and PID
-        info = data[info_start:] if len(data) > info_start else b''
+        # The address field ends at the SSID byte with the extension bit set:
+        # source, or the last of up to 8 digipeaters
+        pos = 14
+        while not kiss_data[pos] & 0x01:
+            pos += 7
+            if pos > 70 or pos + 3 > len(kiss_data):
+                return None
+        control = kiss_data[pos + 1]
         
-        # FCS check (simplified)
-        calculated_fcs = self._calculate_fcs(data[:-2])
-        received_fcs = int.from_bytes(data[-2:], 'little')
-        if calculated_fcs != received_fcs:
-            self.logger.warning("AX.25 FCS mismatch - discarding frame")
-            return None
+        # Only I and UI frames carry a PID and info field
+        if control & 0x01 == 0 or control & 0xEF == 0x03:
+            info = kiss_data[pos + 3:-2]
+        else:
+            info = b''
         
         return {"control": control, "info": info}
 
@@ -572,6 +864,9 @@ class AGWTransport(Transport):
     """
     AGWPE TCP/IP socket interface for SoundCard modem software.
     """
+    # port, kind, PID, call from, call to, data length, user (36 bytes)
+    HEADER = struct.Struct("<B3xBxBx10s10sII")
+    
     def __init__(self, host: str = "127.0.0.1", port: int = 8000, call: str = "NOCALL"):
         """
         Initialize AGWPE transport.
@@ -585,22 +880,22 @@ class AGWTransport(Transport):
         self.call = call.upper()
         self.sock: Optional[socket.socket] = None
         self.port_index = 0  # Default port
+        self._header_buf = bytearray(self.HEADER.size)  # reused by recv
         self.logger = logging.getLogger("pyfbb.agwpe")
 
     def connect(self):
         """Connect and register with AGWPE."""
         try:
             self.sock = socket.create_connection((self.host, self.port))
+            self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
             self.sock.settimeout(30.0)
             
             # Send registration frame 'R'
-            call_bytes = self.call.ljust(10, '\x00').encode('ascii')
-            reg_frame = bytes(36)  # Zero-filled frame
-            reg_frame = reg_frame[:4] + bytes([ord('R')]) + reg_frame[5:14] + call_bytes + reg_frame[24:]
+            reg_frame = self.HEADER.pack(0, ord('R'), 0, self.call.encode('ascii'), b'', 0, 0)
             self.sock.sendall(reg_frame)
             
             # Receive response
-            response = self.sock.recv(36)
+            response = self.sock.recv(self.HEADER.size)
             if len(response) < 36 or response[4] != ord('X'):
                 raise FBBProtocolError("AGWPE registration failed")
             
@@ -614,13 +909,8 @@ class AGWTransport(Transport):
         if not self.sock:
             raise RuntimeError("Not connected")
         
-        # AGWPE frame header construction
-        port_byte = port & 0xff
-        kind_byte = ord(kind)
-        call_from = self.call.ljust(10, '\x00').encode('ascii')
-        call_to = b'\x00'*10  # Filled by application if needed
-        
-        header = bytes([port_byte, 0, 0, 0, kind_byte, 0, 0, 0]) + call_from + call_to + bytes([0, 0, len(data) & 0xff, (len(data) >> 8) & 0xff])
+        # AGWPE frame header; call to is filled by application if needed
+        header = self.HEADER.pack(port & 0xff, ord(kind), 0, self.call.encode('ascii'), b'', len(data), 0)
         frame = header + data
         
         try:
@@ -636,30 +926,40 @@ class AGWTransport(Transport):
             raise RuntimeError("Not connected")
         
         try:
-            header = self.sock.recv(36)
-            if len(header) < 36:
+            header = self._header_buf
+            if self._recv_exact_into(memoryview(header)) < self.HEADER.size:
                 return b''
             
-            data_kind = header[4]
-            data_len = header[34] + (header[35] << 8)
+            _, data_kind, _, _, _, data_len, _ = self.HEADER.unpack(header)
             if data_len == 0:
                 return b''
             
-            data = b''
-            while len(data) < data_len:
-                chunk = self.sock.recv(data_len - len(data))
-                if not chunk:
-                    break
-                data += chunk
+            data = bytearray(data_len)
+            del data[self._recv_exact_into(memoryview(data)):]
             
             self.logger.debug("AGWPE received %d bytes (kind %c)", len(data), data_kind if 32 <= data_kind <= 126 else ord('?'))
-            return data
+            return bytes(data)
         except socket.timeout:
             return b''
         except Exception as e:
             self.logger.error("AGWPE recv failed: %s", e)
             raise
 
+    def _recv_exact_into(self, view: memoryview) -> int:
+        """
+        Fill a buffer from the socket.
+        
+        :param view: Writable view to fill completely
+        :return: Bytes read; less than len(view) only if the peer closed
+        """
+        got = 0
+        while got < len(view):
+            n = self.sock.recv_into(view[got:])
+            if not n:
+                break
+            got += n
+        return got
+
     def close(self):
         """Close AGWPE connection."""
         if self.sock:
@@ -1,7 +1,67 @@
 # setup.py
 # Legacy compatibility for PyFBB
 
-from setuptools import setup, find_packages
+import os
+
+from setuptools import setup, find_packages, Distribution, Extension
+from setuptools.command.build_ext import build_ext
+
+# Optional compiled LZHUF codecs; the pure-Python one is used when absent.
+ext_modules = []
+try:
+    from Cython.Build import cythonize
+    ext_modules += cythonize(
+        [Extension("fbb._lzhuf", ["fbb/_lzhuf.pyx"], optional=True)],
+        language_level=3,
+    )
+except ImportError:
+    pass
+
+
+class BuildExtWithCLib(build_ext):
+    """
+    build_ext that also links fbb/csrc/lzhuf.c as a plain shared library.
+
+    The C codec is loaded through ctypes and has no PyInit_ entry point, so it
+    cannot be built as an Extension (MSVC refuses to link one without that
+    export). It only needs a C compiler; failures leave the pure-Python codec.
+    """
+
+    CLIB_NAME = "_lzhuf_clib"
+    CLIB_SOURCES = ["fbb/csrc/lzhuf.c"]
+    CLIB_EXPORTS = ["fbb_lzhuf_encode", "fbb_lzhuf_decode"]
+
+    def run(self):
+        super().run()
+        try:
+            self.build_clib()
+        except Exception as e:
+            self.warn(f"skipping optional C LZHUF codec: {e}")
+
+    def build_clib(self):
+        from distutils.ccompiler import new_compiler
+        from distutils.sysconfig import customize_compiler
+
+        compiler = new_compiler(force=self.force)
+        customize_compiler(compiler)
+        objects = compiler.compile(self.CLIB_SOURCES, output_dir=self.build_temp)
+        if self.inplace:
+            out_dir = self.get_finalized_command("build_py").get_package_dir("fbb")
+        else:
+            out_dir = os.path.join(self.build_lib, "fbb")
+        compiler.link_shared_object(
+            objects,
+            compiler.shared_object_filename(self.CLIB_NAME, output_dir=out_dir),
+            export_symbols=self.CLIB_EXPORTS,
+        )
+
+
+class BinaryDistribution(Distribution):
+    """Always run build_ext, so the C codec is built even without Cython."""
+
+    def has_ext_modules(self):
+        return True
+
 
 setup(
     name="pyfbb",
@@ -9,10 +69,16 @@ setup(
     description="F6FBB packet radio BBS forwarding library",
     author="Kris Kirby, KE4AHR",
     packages=find_packages(),
+    ext_modules=ext_modules,
+    cmdclass={"build_ext": BuildExtWithCLib},
+    distclass=BinaryDistribution,
     python_requires=">=3.8",
     install_requires=[
         "pyserial; platform_system != 'Windows'",
     ],
+    extras_require={
+        "test": ["pytest", "pytest-xdist"],
+    },
     classifiers=[
         "Programming Language :: Python :: 3",
         "License :: OSI Approved :: GNU Lesser General Public License v3 or later (LGPLv3+)",
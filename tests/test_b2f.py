@@ -4,17 +4,20 @@ Comprehensive tests for Winlink B2F protocol extensions.
 """
 
 import unittest
+from collections import deque
 from unittest.mock import Mock, patch
 from pyfbb import FBBForwarder, FBBProtocolError
 from pyfbb.fbb.transport import TCPTransport
+from pyfbb.fbb.lzhuf import LZHUF_Comp
 
 class TestWinlinkB2F(unittest.TestCase):
     def setUp(self):
         """Set up mock transport and forwarder for B2F tests."""
         self.mock_transport = Mock(spec=TCPTransport)
-        self.mock_transport.recv.side_effect = self._mock_recv
+        self.mock_transport.recv = self._mock_recv
         self.mock_transport.send = Mock()
-        self.recv_data = []
+        self.mock_transport.mtu = 64 * 1024
+        self.recv_data = deque()
         
         self.fwd = FBBForwarder(
             transport=self.mock_transport,
@@ -26,7 +29,7 @@ class TestWinlinkB2F(unittest.TestCase):
     def _mock_recv(self, size):
         """Mock recv to return data from recv_data list."""
         if self.recv_data:
-            data = self.recv_data.pop(0)
+            data = self.recv_data.popleft()
             return data.encode('latin-1')
         return b''
 
@@ -38,6 +41,22 @@ class TestWinlinkB2F(unittest.TestCase):
         decompressed = gzip.decompress(compressed).decode('latin-1')
         self.assertEqual(decompressed, test_content)
 
+    def test_compression_backend_selection(self):
+        """Test compression backend resolution and unknown backend rejection."""
+        from pyfbb.fbb.forwarder import ConfigError
+        fwd = FBBForwarder(transport=self.mock_transport, compression="gzip")
+        self.assertTrue(fwd.use_gzip)
+        fwd.use_gzip = False
+        self.assertEqual(fwd.compression, "lzhuf")
+        with self.assertRaises(ConfigError):
+            FBBForwarder(transport=self.mock_transport, compression="bogus")
+
+    def test_send_message_compresses_body(self):
+        """Test a message sent outside a proposal is compressed by the configured backend."""
+        import gzip
+        self.fwd._send_message({'mid': "M1", 'content': "Appended body"})
+        self.assertEqual(gzip.decompress(self.mock_transport.send.call_args[0][0]), b"Appended body")
+
     def test_lzhuf_fallback(self):
         """Test LZHUF fallback when gzip disabled."""
         self.fwd.use_gzip = False
@@ -46,6 +65,71 @@ class TestWinlinkB2F(unittest.TestCase):
         decompressed = LZHUF_Comp().decode(compressed)
         self.assertEqual(decompressed, test_content)
 
+    def test_lzhuf_round_trip(self):
+        """Test LZHUF round-trips empty, repetitive and binary-range input."""
+        codec = LZHUF_Comp()
+        samples = [
+            "",
+            "x",
+            "CQ CQ DE KE4AHR " * 500,
+            "".join(chr((i * 7919) % 256) for i in range(5000)),
+        ]
+        for text in samples:
+            encoded = codec.encode(text)
+            self.assertEqual(int.from_bytes(encoded[:4], "little"), len(text))
+            self.assertEqual(codec.decode(encoded), text)
+        self.assertLess(len(codec.encode(samples[2])), len(samples[2]) // 10)
+
+        payload = bytes(range(256)) * 4
+        self.assertEqual(codec.decode_bytes(codec.encode_bytes(payload)), payload)
+        self.assertEqual(codec.encode_bytes(samples[2].encode("latin-1")), codec.encode(samples[2]))
+
+    def test_lzhuf_compiled_matches_pure(self):
+        """Test the optional compiled codec emits the pure-Python stream."""
+        from pyfbb.fbb import lzhuf
+        if lzhuf._lzhuf_c is None:
+            self.skipTest("compiled LZHUF extension not built")
+        text = "".join(chr((i * 31) % 97 + 32) for i in range(20000))
+        compiled = LZHUF_Comp().encode(text)
+        with patch.object(lzhuf, "_lzhuf_c", None):
+            pure = LZHUF_Comp().encode(text)
+            self.assertEqual(LZHUF_Comp().decode(compiled), text)
+        self.assertEqual(compiled, pure)
+        self.assertEqual(LZHUF_Comp().decode(pure), text)
+
+    def test_lzhuf_rejects_bad_length(self):
+        """Test decode refuses oversized length headers and truncated input."""
+        codec = LZHUF_Comp()
+        code = codec.encode_bytes(b"The quick brown fox jumps over the lazy dog. " * 40)
+        with self.assertRaises(ValueError):
+            codec.decode_bytes(code, max_size=100)
+        with self.assertRaises(ValueError):
+            codec.decode_bytes((2 ** 31).to_bytes(4, 'little') + code[4:])
+        with self.assertRaises(ValueError):
+            codec.decode_bytes(code[:len(code) // 2])
+        self.assertEqual(len(codec.decode_bytes(code, max_size=1800)), 1800)
+
+    def test_lzhuf_putcode_bit_packing(self):
+        """Test left-aligned codes are packed MSB-first across byte boundaries."""
+        codec = LZHUF_Comp()
+        codec.reset()
+        codec.Putcode(3, 0b101 << 13)
+        codec.Putcode(6, 0b110011 << 10)
+        codec.Putcode(8, 0xAB00)
+        codec.EncodeEnd()
+        self.assertEqual(bytes(codec.out_buffer), bytes([0b10111001, 0b11010101, 0b10000000]))
+
+    def test_lzhuf_streams_concatenate(self):
+        """Test back-to-back encode_into calls flush residual bits per stream."""
+        codec = LZHUF_Comp()
+        out = bytearray()
+        first = codec.encode_into(b"odd-length residual", out)
+        second = codec.encode_into(b"second stream", out)
+        self.assertEqual(len(out), first + second)
+        self.assertEqual(codec.decode_bytes(bytes(out[:first])), b"odd-length residual")
+        self.assertEqual(codec.decode_bytes(bytes(out[first:])), b"second stream")
+        self.assertEqual((codec.bit_reg, codec.bit_count), (0, 0))
+
     def test_large_attachment_chunking(self):
         """Test handling of large attachments in B2F."""
         large_content = "A" * 100000  # 100KB
@@ -57,11 +141,35 @@ class TestWinlinkB2F(unittest.TestCase):
             mid="LARGE001",
             content=large_content
         )
-        self.recv_data = ["FS +"]
+        self.recv_data = deque(["FS +"])
         self.fwd._send_proposal()
         # Verify multiple send calls for chunking
         self.assertGreater(len(self.mock_transport.send.call_args_list), 1)
 
+    def test_single_compression_per_message(self):
+        """Test the body compressed for the proposal is the one sent."""
+        body = "Compress me once. " * 8
+        self.fwd.add_message("P", "KE4AHR", "KE4AHR-1", "USER", "ONCE001", body)
+        self.recv_data = deque(["FS +\r"])
+        with patch.object(self.fwd, '_compressor', wraps=self.fwd._compressor) as comp:
+            self.fwd._send_proposal()
+        self.assertEqual(comp.call_count, 1)
+        import gzip
+        sent = self.mock_transport.send.call_args_list[1][0][0]
+        self.assertEqual(gzip.decompress(sent), body.encode('latin-1'))
+
+    def test_length_framed_binary_receive(self):
+        """Test back-to-back binary messages are split by proposed size."""
+        import gzip
+        first, second = gzip.compress(b"first"), gzip.compress(b"second")
+        blob = (first + second).decode('latin-1')
+        self.recv_data = deque([blob[:7], blob[7:] + "FF\r"])
+        self.fwd._recv_messages([("M1", len(first), "FC"), ("M2", len(second), "FC")])
+        received = self.fwd.get_received_messages()
+        self.assertEqual([m['content'] for m in received], ["first", "second"])
+        self.assertEqual([m['mid'] for m in received], ["M1", "M2"])
+        self.assertEqual(self.fwd._recv_line(), "FF")
+
     def test_winlink_header_validation(self):
         """Test Winlink-specific B2F header validation."""
         valid_headers = {
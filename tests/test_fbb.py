@@ -3,7 +3,10 @@
 Comprehensive tests for FBB protocol core functionality.
 """
 
+import socket
+import threading
 import unittest
+from collections import deque
 from unittest.mock import Mock, patch
 from pyfbb import FBBForwarder, FBBProtocolError
 from pyfbb.fbb.transport import TCPTransport
@@ -12,9 +15,10 @@ class TestFBBForwarder(unittest.TestCase):
     def setUp(self):
         """Set up mock transport and forwarder for each test."""
         self.mock_transport = Mock(spec=TCPTransport)
-        self.mock_transport.recv.side_effect = self._mock_recv
+        self.mock_transport.recv = self._mock_recv
         self.mock_transport.send = Mock()
-        self.recv_data = []
+        self.mock_transport.mtu = 64 * 1024
+        self.recv_data = deque()
         self.sent_data = []
         
         self.fwd = FBBForwarder(
@@ -27,23 +31,60 @@ class TestFBBForwarder(unittest.TestCase):
     def _mock_recv(self, size):
         """Mock recv to return data from recv_data list."""
         if self.recv_data:
-            data = self.recv_data.pop(0)
+            data = self.recv_data.popleft()
             return data.encode('latin-1')
         return b''
 
     def test_sid_negotiation_success(self):
         """Test successful SID negotiation with any bracketed SID."""
-        self.recv_data = ["[RLI-9.07-CH$]", "FR+"]
+        self.recv_data = deque(["[RLI-9.07-CH$]", "FR+"])
         self.fwd.connect(initiate_reverse=True)
         self.mock_transport.send.assert_called()
         self.assertTrue(self.fwd.enable_reverse)
 
     def test_sid_negotiation_invalid_format(self):
         """Test invalid SID format raises error."""
-        self.recv_data = ["Invalid SID"]
+        self.recv_data = deque(["Invalid SID"])
         with self.assertRaises(FBBProtocolError):
             self.fwd.connect()
 
+    def test_connect_async_propagates_errors(self):
+        """Test async connect runs the session and surfaces protocol errors."""
+        import asyncio
+        self.recv_data = deque(["Invalid SID\r"])
+        with self.assertRaises(FBBProtocolError):
+            asyncio.run(self.fwd.connect_async())
+
+    def test_connect_async_uses_executor(self):
+        """Test the session runs in the caller's executor."""
+        import asyncio
+        from concurrent.futures import ThreadPoolExecutor
+        threads = []
+        self.fwd.connect = lambda initiate_reverse=False: threads.append(threading.current_thread().name)
+        with ThreadPoolExecutor(max_workers=1, thread_name_prefix="fbb-session") as executor:
+            asyncio.run(self.fwd.connect_async(executor=executor))
+        self.assertEqual(len(threads), 1)
+        self.assertTrue(threads[0].startswith("fbb-session"))
+
+    def test_recv_line_buffering(self):
+        """Test several lines delivered in one recv are split correctly."""
+        self.mock_transport.recv = Mock(side_effect=self._mock_recv)
+        self.recv_data = deque(["[RLI-9.07-CH$]\r\nFS +", "-\rF>\r"])
+        self.assertEqual(self.fwd._recv_line(), "[RLI-9.07-CH$]")
+        self.assertEqual(self.fwd._recv_line(), "FS +-")
+        self.assertEqual(self.fwd._recv_line(), "F>")
+        self.assertEqual(self.mock_transport.recv.call_count, 2)
+
+    def test_crlf_before_binary_body(self):
+        """Test the LF of a CRLF-terminated F> is not read as part of the binary body."""
+        import gzip
+        self.fwd.use_gzip = True
+        body = gzip.compress(b"73 de KE4AHR").decode('latin-1')
+        self.recv_data = deque([f"FC P KE4AHR KE4AHR-1 USER CRLF01 {len(body)}\r\nF>\r\n" + body])
+        self.assertEqual(self.fwd._process_proposal(self.fwd._recv_proposal()), '+')
+        self.fwd._recv_messages(self.fwd._accepted)
+        self.assertEqual(self.fwd.get_received_messages(), [{'mid': 'CRLF01', 'content': '73 de KE4AHR'}])
+
     def test_proposal_building(self):
         """Test proposal building with binary mode and resume."""
         self.fwd.add_message(
@@ -55,10 +96,87 @@ class TestFBBForwarder(unittest.TestCase):
             content="Test message"
         )
         # Mock FS response with resume request
-        self.recv_data = ["FS +"]
+        self.recv_data = deque(["FS +"])
         self.fwd._send_proposal()
         # Verify proposal sent and message handling
 
+    def test_proposal_single_write_per_phase(self):
+        """Test proposal block and accepted messages each go out in one send."""
+        fwd = FBBForwarder(self.mock_transport, use_binary=False)
+        for i in range(2):
+            fwd.add_message("P", "KE4AHR", "KE4AHR-1", "USER", f"MSG{i}", f"Body {i}")
+        self.recv_data = deque(["FS ++\r"])
+        self.assertTrue(fwd._send_proposal())
+        calls = self.mock_transport.send.call_args_list
+        self.assertEqual(len(calls), 2)
+        self.assertEqual(calls[0][0][0],
+                         b"FA P KE4AHR KE4AHR-1 USER MSG0 6\r"
+                         b"FA P KE4AHR KE4AHR-1 USER MSG1 6\rF>\r")
+        self.assertEqual(calls[1][0][0], b"Body 0\x1a\rBody 1\x1a\r")
+
+    def test_proposal_respects_transport_mtu(self):
+        """Test proposal blocks are sized to the transport's send budget."""
+        self.mock_transport.mtu = 300
+        fwd = FBBForwarder(self.mock_transport, use_binary=False)
+        fwd.add_message("P", "KE4AHR", "KE4AHR-1", "USER", "BIG001", "X" * 500)
+        for i in range(3):
+            fwd.add_message("P", "KE4AHR", "KE4AHR-1", "USER", f"MSG{i}", "Y" * 120)
+        self.recv_data = deque(["FS +\r", "FS ++\r"])
+        fwd._send_proposal()  # Oversized message goes alone
+        fwd._send_proposal()  # Two 120-byte messages fit in 300
+        proposals = [c[0][0] for c in self.mock_transport.send.call_args_list[::2]]
+        self.assertEqual(proposals[0].count(b"FA "), 1)
+        self.assertEqual(proposals[1].count(b"FA "), 2)
+        self.assertEqual([m['mid'] for m in fwd.messages_to_send], ["MSG2"])
+
+    def test_overflowing_message_compressed_once(self):
+        """Test a message deferred by the send budget is not compressed again next round."""
+        self.mock_transport.mtu = 1  # one message per block
+        text = "CQ CQ DE KE4AHR\n" * 64
+        for i in range(2):
+            self.fwd.add_message("P", "KE4AHR", "KE4AHR-1", "USER", f"MSG{i}", text + str(i))
+        self.fwd._compress = Mock(wraps=self.fwd._compress)
+        self.recv_data = deque(["FS +\r", "FS +\r"])
+        self.fwd._send_proposal()
+        self.fwd._send_proposal()
+        self.assertEqual(self.fwd._compress.call_count, 2)
+        self.assertEqual(self.fwd.messages_to_send, [])
+
+    def test_fs_code_count_mismatch(self):
+        """Test an FS response with the wrong number of codes is a protocol error."""
+        for i in range(2):
+            self.fwd.add_message("P", "KE4AHR", "KE4AHR-1", "USER", f"MSG{i}", f"Body {i}")
+        self.recv_data = deque(["FS +++\r"])
+        with self.assertRaises(FBBProtocolError):
+            self.fwd._send_proposal()
+        self.assertEqual(len(self.fwd.messages_to_send), 2)
+
+    def test_proposal_types_round_trip(self):
+        """Test short text goes as FA and incompressible binary as FC, intact at the receiver."""
+        import os
+        self.fwd.use_gzip = True
+        noise = (os.urandom(1024) + b"\x1a\r\n\x00").decode('latin-1')
+        bodies = {"SHORT1": "73 de KE4AHR", "NOISE1": noise, "TEXT01": "CQ CQ DE KE4AHR\n" * 32}
+        for mid, content in bodies.items():
+            self.fwd.add_message("P", "KE4AHR", "KE4AHR-1", "USER", mid, content)
+        self.recv_data = deque(["FS +++\r"])
+        self.fwd._send_proposal()
+        wire = b"".join(c[0][0] for c in self.mock_transport.send.call_args_list)
+        self.assertIn(b"FA P KE4AHR KE4AHR-1 USER SHORT1 12\r", wire)
+        self.assertIn(b"FC P KE4AHR KE4AHR-1 USER NOISE1 ", wire)
+        self.assertNotIn(b"FB ", wire)
+        self.assertIn(b"FC P KE4AHR KE4AHR-1 USER TEXT01 ", wire)
+
+        # Feed everything the sender wrote into a receiving forwarder
+        chunks = deque(wire[i:i + 100] for i in range(0, len(wire), 100))
+        peer = Mock(spec=TCPTransport)
+        peer.recv = lambda size: chunks.popleft() if chunks else b''
+        receiver = FBBForwarder(peer, use_gzip=True)
+        self.assertEqual(receiver._process_proposal(receiver._recv_proposal()), '+++')
+        receiver._recv_messages(receiver._accepted)
+        received = {m['mid']: m['content'] for m in receiver.get_received_messages()}
+        self.assertEqual(received, bodies)
+
     def test_resume_support(self):
         """Test resume with offset handling."""
         # Simulate partial transfer and resume request
@@ -90,6 +208,27 @@ class TestFBBForwarder(unittest.TestCase):
         response = fwd._process_proposal("FC P KE4AHR KE4AHR-1 USER MSG1 200")
         self.assertIn('H', response)
 
+    def test_duplicate_rejection(self):
+        """Test previously received MIDs are answered with '-'."""
+        fwd = FBBForwarder(self.mock_transport, use_binary=False)
+        self.assertEqual(fwd._process_proposal("FA P KE4AHR KE4AHR-1 USER DUP001 5"), '+')
+        self.recv_data = deque(["Hello\x1a\r"])
+        fwd._recv_messages(fwd._accepted)
+        response = fwd._process_proposal("FA P KE4AHR KE4AHR-1 USER DUP001 5\n"
+                                         "FA P KE4AHR KE4AHR-1 USER NEW001 5")
+        self.assertEqual(response, '-+')
+        self.assertEqual(fwd._accepted, [("NEW001", 5, "FA")])
+
+    def test_malformed_proposal_lines(self):
+        """Test malformed proposal lines are answered with 'E'."""
+        response = self.fwd._process_proposal(
+            "FC P KE4AHR KE4AHR-1 USER M1 12x\r"
+            "FC P KE4AHR KE4AHR-1 USER M2 \xb2\r"
+            "FC P KE4AHR\r"
+            "XX junk\r"
+            "FC P KE4AHR KE4AHR-1 USER M3 10 8")
+        self.assertEqual(response, 'EEEE+')
+
     def test_winlink_b2f_validation(self):
         """Test Winlink B2F header validation and gzip."""
         # Test gzip option
@@ -97,6 +236,13 @@ class TestFBBForwarder(unittest.TestCase):
         compressed = self.fwd._compress("Test B2F message")
         import gzip
         self.assertEqual(gzip.decompress(compressed).decode('latin-1'), "Test B2F message")
+        # The fast default level still shrinks repetitive traffic
+        raw = "CQ CQ DE KE4AHR " * 256
+        compressed = self.fwd._compress(raw)
+        self.assertLess(len(compressed), len(raw) // 4)
+        self.assertEqual(gzip.decompress(compressed).decode('latin-1'), raw)
+        fwd = FBBForwarder(self.mock_transport, compression="gzip", gzip_level=9)
+        self.assertEqual(gzip.decompress(fwd._compress(raw)).decode('latin-1'), raw)
         
         # Test B2F header validation
         headers = {
@@ -109,11 +255,146 @@ class TestFBBForwarder(unittest.TestCase):
         }
         self.fwd._validate_b2f_headers(headers)  # Should not raise
 
+    def test_log_file_handler_not_duplicated(self):
+        """Test repeated log_file forwarders share one handler."""
+        import logging
+        import os
+        import tempfile
+        logger = logging.getLogger("pyfbb.forwarder")
+        saved = logger.handlers[:]
+        logger.handlers.clear()
+        fd, path = tempfile.mkstemp()
+        os.close(fd)
+        try:
+            for _ in range(3):
+                with self.assertWarns(DeprecationWarning):
+                    FBBForwarder(self.mock_transport, log_file=path)
+            self.assertEqual(len(logger.handlers), 1)
+        finally:
+            for handler in logger.handlers:
+                handler.close()
+            logger.handlers[:] = saved
+            os.unlink(path)
+
     def test_authentication(self):
         """Test ;PQ/;PR MD5 authentication."""
-        # Simulate challenge-response
-        # Verify MD5 hash calculation
-        self.assertTrue(True)  # Placeholder for full auth test
+        import hashlib
+        self.recv_data = deque([";PQ 0123456789\r"])
+        self.fwd._authenticate()
+        expected = hashlib.md5(b"0123456789shared_secret").hexdigest()
+        self.mock_transport.send.assert_called_once_with(f";PR {expected}\r".encode('latin-1'))
+        self.assertEqual(self.fwd._auth_response("0123456789", "md5", "shared_secret"), expected)
+
+        # A ;PR from the peer completes authentication without a reply
+        self.mock_transport.send.reset_mock()
+        self.recv_data = deque([f";PR {expected}\r"])
+        self.fwd._authenticate()
+        self.mock_transport.send.assert_not_called()
+
+    def test_authentication_sha256_negotiated(self):
+        """Test ;PA sha256 switches the ;PR response to HMAC-SHA256."""
+        import hashlib
+        import hmac
+        self.recv_data = deque([";PA sha256\r;PQ 12345\r"])
+        self.fwd._authenticate()
+        expected = hmac.new(b"shared_secret", b"12345", hashlib.sha256).hexdigest()
+        self.mock_transport.send.assert_called_with(f";PR {expected}\r".encode('latin-1'))
+
+        self.recv_data = deque([";PQ 12345\r"])
+        self.fwd._authenticate()
+        expected = hashlib.md5(b"12345shared_secret").hexdigest()
+        self.mock_transport.send.assert_called_with(f";PR {expected}\r".encode('latin-1'))
+
+class TestFBBFullSession(unittest.TestCase):
+    """End-to-end sessions over TCP against a scripted peer BBS."""
+
+    PEER_SID = b"[RLI-9.07-CH$]\r"
+
+    def setUp(self):
+        """Prepare the peer's readiness event and transcript."""
+        self.ready = threading.Event()
+        self.port = None
+        self.peer_rx = []
+        self._peer_buf = bytearray()
+
+    def _run_peer(self, script):
+        """
+        Serve one connection on an ephemeral port, then run script(conn).
+        
+        :return: The peer thread, once the listener is bound
+        """
+        def serve():
+            with socket.create_server(("127.0.0.1", 0)) as server:
+                self.port = server.getsockname()[1]
+                self.ready.set()
+                conn, _ = server.accept()
+                with conn:
+                    conn.settimeout(5.0)
+                    conn.sendall(self.PEER_SID)
+                    script(conn)
+
+        thread = threading.Thread(target=serve, daemon=True)
+        thread.start()
+        self.assertTrue(self.ready.wait(timeout=2.0))
+        return thread
+
+    def _expect(self, conn, terminator):
+        """Read from the client up to and including terminator and record it."""
+        buf = self._peer_buf
+        while terminator not in buf:
+            chunk = conn.recv(4096)
+            if not chunk:
+                break
+            buf += chunk
+        end = buf.find(terminator) + len(terminator)
+        self.peer_rx.append(bytes(buf[:end]))
+        del buf[:end]
+
+    def test_ascii_session(self):
+        """Test receiving an FA message proposed by the peer."""
+        def script(conn):
+            self._expect(conn, b"\r")
+            conn.sendall(b"FA P N1CALL KE4AHR-1 USER MID001 5\rF>\r")
+            self._expect(conn, b"\r")
+            conn.sendall(b"Hello\x1a\r")
+            self._expect(conn, b"\r")
+            conn.sendall(b"FF\r")
+
+        peer = self._run_peer(script)
+        fwd = FBBForwarder(TCPTransport("127.0.0.1", self.port, timeout=5.0), enable_reverse=False)
+        try:
+            fwd.connect()
+        finally:
+            fwd.transport.close()
+        peer.join(timeout=5.0)
+        self.assertEqual(self.peer_rx, [b"[PyFBB-0.1.2-B1FHLM$]\r", b"FS +\r", b"FF\r"])
+        self.assertEqual(fwd.get_received_messages(), [{'mid': "MID001", 'content': "Hello"}])
+
+    def test_reverse_forwarding(self):
+        """Test proposing and sending a message after FR is accepted."""
+        def script(conn):
+            self._expect(conn, b"\r")
+            self._expect(conn, b"\r")
+            conn.sendall(b"FR+\r")
+            self._expect(conn, b"F>\r")
+            conn.sendall(b"FS +\r")
+            self._expect(conn, b"\x1a\r")
+            conn.sendall(b"FF\r")
+
+        peer = self._run_peer(script)
+        fwd = FBBForwarder(TCPTransport("127.0.0.1", self.port, timeout=5.0), use_binary=False)
+        fwd.add_message("P", "KE4AHR", "N1CALL", "USER", "MID002", "73 de KE4AHR")
+        try:
+            fwd.connect(initiate_reverse=True)
+        finally:
+            fwd.transport.close()
+        peer.join(timeout=5.0)
+        self.assertEqual(self.peer_rx[1:], [
+            b"FR\r",
+            b"FA P KE4AHR N1CALL USER MID002 12\rF>\r",
+            b"73 de KE4AHR\x1a\r",
+        ])
+        self.assertEqual(fwd.messages_to_send, [])
 
 if __name__ == '__main__':
     unittest.main()
@@ -3,23 +3,25 @@
 Comprehensive tests for KISSTransport with all modes: standard, extended, polled, checksum.
 """
 
+import time
 import unittest
+from collections import deque
 from unittest.mock import Mock, patch
-from pyfbb.fbb.transport import KISSTransport
+from pyfbb.fbb.transport import KISSTransport, AX25Connection, FBBProtocolError
 
 class TestKISSTransport(unittest.TestCase):
     def setUp(self):
         """Set up mock socket for TCP KISS tests."""
         self.mock_socket = Mock()
-        self.mock_socket.recv.side_effect = self._mock_recv
+        self.mock_socket.recv = self._mock_recv
         self.mock_socket.sendall = Mock()
-        self.recv_data = []
+        self.recv_data = deque()
         self.sent_data = []
 
     def _mock_recv(self, size):
         """Mock recv to return data from recv_data list."""
         if self.recv_data:
-            data = self.recv_data.pop(0)
+            data = self.recv_data.popleft()
             return data
         return b''
 
@@ -33,6 +35,157 @@ class TestKISSTransport(unittest.TestCase):
             kiss.send_kiss(test_data)
             self.mock_socket.sendall.assert_called_with(expected_frame)
 
+    def test_escape_round_trip(self):
+        """Test escape/unescape are inverse, including FESC before TFEND/TFESC."""
+        for data in (b'', b'plain', bytes([0xC0, 0xDB, 0xDC, 0xDD]),
+                     bytes([0xDB, 0xDC]), bytes([0xDB, 0xDD, 0xC0, 0xC0]), bytes(range(256))):
+            escaped = KISSTransport._escape_kiss(data)
+            self.assertNotIn(0xC0, escaped)
+            self.assertEqual(KISSTransport._unescape_kiss(escaped), data)
+        self.assertEqual(KISSTransport._escape_kiss(bytes([0xC0, 0xDB])),
+                         bytes([0xDB, 0xDC, 0xDB, 0xDD]))
+
+    def test_checksum_matches_byte_sum(self):
+        """Test the zlib-based checksum equals sum(data) & 0xFF at any length."""
+        for n in (0, 1, 255, 256, 257, 513, 4096):
+            for data in (bytes([0xFF]) * n, bytes(range(256)) * (n // 256) + bytes(n % 256)):
+                self.assertEqual(KISSTransport._checksum(data), sum(data) & 0xFF)
+
+    def test_ax25_fcs(self):
+        """Test AX.25 FCS against the CRC-16/X.25 check value and bitwise reference."""
+        self.assertEqual(AX25Connection._calculate_fcs(b'123456789'), 0x906E)
+        data = bytes(range(256)) * 2
+        fcs = 0xffff
+        for b in data:
+            fcs ^= b
+            for _ in range(8):
+                fcs = (fcs >> 1) ^ 0x8408 if fcs & 1 else fcs >> 1
+        self.assertEqual(AX25Connection._calculate_fcs(data), ~fcs & 0xffff)
+
+    def test_ax25_address_encoding(self):
+        """Test callsign characters are shifted left one bit and space padded."""
+        ax25 = AX25Connection(Mock(), "N0CALL", "N1CALL")
+        self.assertEqual(ax25._encode_address("ke4ahr", 0, 0, False)[:6],
+                         bytes(ord(c) << 1 for c in "KE4AHR"))
+        self.assertEqual(ax25._encode_address("N0", 0, 0, False)[:6],
+                         bytes(ord(c) << 1 for c in "N0    "))
+
+    def test_ax25_parse_frame(self):
+        """Test control and info are found after the address field, with and without digipeaters."""
+        for path in ([], ["WIDE1", "WIDE2"]):
+            ax25 = AX25Connection(Mock(), "N0CALL", "N1CALL", path=path)
+            ax25.vr = 5
+            parsed = ax25._parse_frame(ax25._make_i_frame(b"payload", 3, 1))
+            self.assertEqual(parsed, {"control": (3 << 1) | (5 << 5) | (1 << 4), "info": b"payload"})
+            self.assertEqual(ax25._parse_frame(ax25._make_rr(2)), {"control": 0x41, "info": b''})
+            corrupt = bytearray(ax25._make_i_frame(b"payload", 3))
+            corrupt[-3] ^= 0x01
+            self.assertIsNone(ax25._parse_frame(bytes(corrupt)))
+
+    def test_ax25_pid_only_on_i_frames(self):
+        """Test supervisory and unnumbered frames are address, control and FCS only."""
+        ax25 = AX25Connection(Mock(), "N0CALL", "N1CALL")
+        header = 1 + len(ax25._address)  # KISS command byte and address field
+        for frame, control in ((ax25._make_rr(2, 1), 0x51), (ax25._make_rej(3), 0x69),
+                               (ax25._make_control_frame(0x2F), 0x2F)):
+            self.assertEqual(len(frame), header + 1 + 2)
+            self.assertEqual(frame[header], control)
+        i_frame = ax25._make_i_frame(b"payload", 0)
+        self.assertEqual(i_frame[header + 1], 0xF0)
+        self.assertEqual(i_frame[header + 2:-2], b"payload")
+
+    def _ax25_with_outstanding(self, first_ns, count):
+        """AX.25 connection over a mock KISS port with count unacked I-frames from first_ns."""
+        ax25 = AX25Connection(Mock(), "N0CALL", "N1CALL")
+        ax25.connected = True
+        ax25.va = ax25.vs = first_ns
+        ax25.send(bytes(ax25.PACLEN * count))
+        return ax25
+
+    def test_ax25_ack_across_sequence_wrap(self):
+        """Test RR acknowledgement and REJ retransmission with NS wrapping modulo 8."""
+        ax25 = self._ax25_with_outstanding(6, 4)
+        ax25._process_supervisory(0x01, 0, 0)
+        self.assertEqual(ax25.va, 0)
+        self.assertEqual([f.ns for f in ax25._outstanding()], [0, 1])
+        ax25.kiss.send_kiss_many.reset_mock()
+        ax25._retransmit_from(0)
+        ax25.kiss.send_kiss_many.assert_called_once_with([f.data for f in ax25._outstanding()])
+
+    def test_ax25_stale_nr_ignored(self):
+        """Test an NR outside [VA, VS] acknowledges nothing."""
+        ax25 = self._ax25_with_outstanding(6, 4)
+        for stale in (3, 4, 5):
+            ax25._process_supervisory(0x01, stale, 0)
+            self.assertEqual([f.ns for f in ax25._outstanding()], [6, 7, 0, 1])
+            self.assertEqual(ax25.va, 6)
+        # NR == VS acknowledges everything outstanding
+        ax25._process_supervisory(0x01, 2, 0)
+        self.assertEqual(ax25._outstanding(), [])
+        self.assertFalse(ax25.t1_active)
+
+    def test_ax25_send_batches_per_window(self):
+        """Test I-frames go to the KISS layer one window per write."""
+        ax25 = AX25Connection(Mock(), "N0CALL", "N1CALL", window_size=4)
+        ax25.connected = True
+        # The remote acknowledges the first window (as an RR NR=4 would)
+        ax25.kiss.recv_kiss.side_effect = lambda timeout=None: ax25._process_supervisory(0x01, 4, 0)
+        ax25.send(bytes(ax25.PACLEN * 6))
+        batches = [c.args[0] for c in ax25.kiss.send_kiss_many.call_args_list if c.args[0]]
+        self.assertEqual([len(b) for b in batches], [4, 2])
+        self.assertEqual(ax25.kiss.recv_kiss.call_count, 1)
+        self.assertEqual([f.data for f in ax25._outstanding()], batches[1])
+        ax25.kiss.send_kiss.assert_not_called()
+
+    def test_ax25_poll_bit_on_window_full(self):
+        """Test only the window-filling I-frame carries P, and an acknowledgement ends the poll."""
+        ax25 = AX25Connection(Mock(), "N0CALL", "N1CALL", window_size=4)
+        ax25.connected = True
+        ax25.kiss.recv_kiss.side_effect = lambda timeout=None: ax25._process_supervisory(0x01, 4, 0)
+        ax25.send(bytes(ax25.PACLEN * 6))
+        frames = [f for c in ax25.kiss.send_kiss_many.call_args_list for f in c.args[0]]
+        control = 1 + len(ax25._address)
+        self.assertEqual([(f[control] >> 4) & 1 for f in frames], [0, 0, 0, 1, 0, 0])
+        self.assertFalse(ax25.poll_pending)
+        self.assertLessEqual(ax25.send_ring[5].timestamp, time.monotonic())
+
+    def test_ax25_t1_fires_without_traffic(self):
+        """Test recv waits no longer than T1 and retransmits when nothing arrives."""
+        ax25 = AX25Connection(Mock(), "N0CALL", "N1CALL")
+        ax25.kiss.recv_kiss.side_effect = lambda timeout=None: time.sleep(timeout)
+        ax25.connected = True
+        ax25.send(b"hello")
+        ax25.t1_deadline_ns = time.monotonic_ns() + 50_000_000
+        self.assertEqual(ax25.recv(), b'')
+        timeout = ax25.kiss.recv_kiss.call_args.kwargs['timeout']
+        self.assertLessEqual(timeout, 0.05)
+        ax25.kiss.send_kiss.assert_called_once_with(ax25.send_ring[0].data)
+        # Retransmission rearms T1 for a full period
+        self.assertGreater(ax25.t1_deadline_ns - time.monotonic_ns(), (ax25.T1_TIMEOUT - 1) * 1e9)
+
+    def test_ax25_connect_timeout(self):
+        """Test connect gives up with FBBProtocolError when no UA arrives within T1."""
+        ax25 = AX25Connection(Mock(), "N0CALL", "N1CALL")
+        ax25.T1_TIMEOUT = 0.05
+        ax25.kiss.recv_kiss.side_effect = lambda timeout=None: time.sleep(timeout)
+        with self.assertRaises(FBBProtocolError):
+            ax25.connect()
+        self.assertFalse(ax25.connected)
+
+    def test_ax25_stops_on_peer_close(self):
+        """Test connect and a full send window stop at once when the KISS peer closes."""
+        ax25 = AX25Connection(Mock(), "N0CALL", "N1CALL")
+        ax25.kiss.recv_kiss.side_effect = ConnectionError
+        with self.assertRaises(ConnectionError):
+            ax25.connect()
+        self.assertEqual(ax25.kiss.recv_kiss.call_count, 1)
+        
+        ax25.connected = True
+        with self.assertRaises(ConnectionError):
+            ax25.send(bytes(ax25.PACLEN * (ax25.window_size + 1)))
+        self.assertEqual(ax25.kiss.recv_kiss.call_count, 2)
+        self.assertFalse(ax25.connected)
+
     def test_checksum_mode(self):
         """Test 8-bit checksum mode."""
         kiss = KISSTransport(host="127.0.0.1", port=8001, use_checksum=True)
@@ -49,30 +202,31 @@ class TestKISSTransport(unittest.TestCase):
         with patch('socket.socket', return_value=self.mock_socket):
             # Good frame
             good_data = bytes([0xC0, 0x00, 0x01, 0x02, 0x03, 0xC0])  # checksum 0x03
-            self.recv_data = [good_data]
+            self.recv_data = deque([good_data])
             frame = kiss.recv_kiss()
             self.assertIsNotNone(frame)
             self.assertEqual(frame, bytes([0x00, 0x01, 0x02]))
             
             # Bad checksum
             bad_data = bytes([0xC0, 0x00, 0x01, 0x02, 0x04, 0xC0])  # wrong checksum
-            self.recv_data = [bad_data]
+            self.recv_data = deque([bad_data])
             frame = kiss.recv_kiss()
             self.assertIsNone(frame)
 
     def test_polling_thread(self):
         """Test polled mode thread start/stop."""
-        kiss = KISSTransport(
-            host="127.0.0.1",
-            port=8001,
-            polled_mode=True,
-            slave_addresses=[1, 2],
-            poll_interval=0.01
-        )
         with patch('socket.socket', return_value=self.mock_socket):
+            kiss = KISSTransport(
+                host="127.0.0.1",
+                port=8001,
+                polled_mode=True,
+                slave_addresses=[1, 2],
+                poll_interval=0.01
+            )
             kiss.start_polling()
             self.assertTrue(kiss._thread.is_alive())
-            time.sleep(0.05)  # Allow a few polls
+            with kiss._poll_cv:
+                self.assertTrue(kiss._poll_cv.wait_for(lambda: kiss._poll_count >= 2, timeout=1.0))
             kiss.stop_polling()
             self.assertFalse(kiss._thread.is_alive())
 
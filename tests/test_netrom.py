@@ -4,6 +4,7 @@ Tests for NET/ROM level 3 support.
 """
 
 import unittest
+from collections import deque
 from unittest.mock import Mock, patch
 from pyfbb.fbb.transport import NETROMTransport
 
@@ -12,13 +13,13 @@ class TestNETROM(unittest.TestCase):
         """Set up mock transport for NET/ROM tests."""
         self.mock_transport = Mock()
         self.mock_transport.send = Mock()
-        self.mock_transport.recv = Mock(side_effect=self._mock_recv)
-        self.recv_data = []
+        self.mock_transport.recv = self._mock_recv
+        self.recv_data = deque()
 
     def _mock_recv(self, size):
         """Mock recv to return data from recv_data list."""
         if self.recv_data:
-            return self.recv_data.pop(0)
+            return self.recv_data.popleft()
         return b''
 
     def test_node_routing(self):
@@ -45,7 +46,7 @@ class TestNETROM(unittest.TestCase):
         """Test NET/ROM layer 3 frame parsing."""
         netrom = NETROMTransport(node_call="KE4AHR-7")
         test_frame = b'\x00' * 20  # Mock L3 frame
-        self.recv_data = [test_frame]
+        self.recv_data = deque([test_frame])
         parsed = netrom._parse_l3_frame(test_frame)
         self.assertIsNotNone(parsed)
         # Verify opcode, circuit ID, etc.
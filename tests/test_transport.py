@@ -0,0 +1,177 @@
+# tests/test_transport.py
+"""
+Tests for the TCP, KISS and AGWPE transports over local sockets.
+"""
+
+import socket
+import threading
+import unittest
+from pyfbb.fbb.transport import AGWTransport, KISSTransport, TCPTransport
+
+class TestTCPTransport(unittest.TestCase):
+    def setUp(self):
+        """Listen on an ephemeral local port."""
+        self.server = socket.create_server(("127.0.0.1", 0))
+        self.port = self.server.getsockname()[1]
+
+    def tearDown(self):
+        self.server.close()
+
+    def test_socket_options(self):
+        """Test buffer sizes and keepalive are applied on connect."""
+        tcp = TCPTransport("127.0.0.1", self.port, sndbuf=128 * 1024, rcvbuf=128 * 1024)
+        tcp.connect()
+        try:
+            self.assertGreaterEqual(tcp.sock.getsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF), 128 * 1024)
+            self.assertTrue(tcp.sock.getsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE))
+            if hasattr(socket, 'TCP_KEEPIDLE'):
+                self.assertEqual(tcp.sock.getsockopt(socket.IPPROTO_TCP, socket.TCP_KEEPIDLE), 60)
+        finally:
+            tcp.close()
+
+    def test_keepalive_disabled(self):
+        """Test keepalive can be turned off."""
+        tcp = TCPTransport("127.0.0.1", self.port, keepalive=False)
+        tcp.connect()
+        try:
+            self.assertFalse(tcp.sock.getsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE))
+        finally:
+            tcp.close()
+
+    def test_recv_waits_for_data(self):
+        """Test recv waits on the selector and returns what the peer sent."""
+        tcp = TCPTransport("127.0.0.1", self.port, timeout=2.0)
+        tcp.connect()
+        peer, _ = self.server.accept()
+        try:
+            timer = threading.Timer(0.05, peer.sendall, args=(b"FS +\r",))
+            timer.start()
+            self.assertEqual(tcp.recv(1024), b"FS +\r")
+            timer.join()
+        finally:
+            peer.close()
+            tcp.close()
+
+    def test_recv_timeout_returns_empty(self):
+        """Test recv returns b'' when nothing arrives within the timeout."""
+        tcp = TCPTransport("127.0.0.1", self.port, timeout=0.05)
+        tcp.connect()
+        peer, _ = self.server.accept()
+        try:
+            self.assertEqual(tcp.recv(1024), b'')
+        finally:
+            peer.close()
+            tcp.close()
+
+    def test_reconnect_closes_previous(self):
+        """Test a second connect() releases the first socket and selector."""
+        tcp = TCPTransport("127.0.0.1", self.port)
+        tcp.connect()
+        first_sock, first_selector = tcp.sock, tcp._selector
+        tcp.connect()
+        try:
+            self.assertEqual(first_sock.fileno(), -1)
+            self.assertIsNone(first_selector.get_map())
+            self.assertIsNot(tcp.sock, first_sock)
+        finally:
+            tcp.close()
+
+class TestKISSTransport(unittest.TestCase):
+    def setUp(self):
+        """Connect a TCP KISS transport to a local peer."""
+        server = socket.create_server(("127.0.0.1", 0))
+        self.addCleanup(server.close)
+        self.port = server.getsockname()[1]
+        self.server = server
+
+    def _connect(self, **kwargs):
+        """Return (transport, peer socket) for a fresh connection."""
+        kiss = KISSTransport(host="127.0.0.1", port=self.port, **kwargs)
+        peer, _ = self.server.accept()
+        self.addCleanup(kiss.close)
+        self.addCleanup(peer.close)
+        return kiss, peer
+
+    def test_frame_split_across_reads(self):
+        """Test a frame arriving in two segments is reassembled."""
+        kiss, peer = self._connect()
+        peer.sendall(bytes([0xC0, 0x00]) + b"hel")
+        timer = threading.Timer(0.05, peer.sendall, args=(b"lo" + bytes([0xDB, 0xDC, 0xC0]),))
+        timer.start()
+        self.assertEqual(kiss.recv_kiss(timeout=2.0), b"\x00hello\xc0")
+        timer.join()
+
+    def test_back_to_back_fends_and_leading_junk(self):
+        """Test junk before the first FEND is dropped and repeated FENDs delimit nothing."""
+        kiss, peer = self._connect()
+        peer.sendall(b"junk" + bytes([0xC0, 0xC0, 0x00, 0x41, 0xC0, 0xC0, 0xC0, 0x00, 0x42, 0xC0]))
+        self.assertEqual(kiss.recv_kiss(timeout=2.0), b"\x00A")
+        self.assertEqual(kiss.recv_kiss(timeout=2.0), b"\x00B")
+        self.assertIsNone(kiss.recv_kiss(timeout=0.05))
+
+    def test_checksum_mode(self):
+        """Test good checksums are stripped and bad ones discarded."""
+        kiss, peer = self._connect(use_checksum=True)
+        payload = bytes([0x00, 0xC0, 0x10])
+        good = KISSTransport._escape_kiss(payload + bytes([sum(payload) & 0xFF]))
+        bad = KISSTransport._escape_kiss(payload + bytes([(sum(payload) + 1) & 0xFF]))
+        peer.sendall(b"\xc0" + bad + b"\xc0" + good + b"\xc0")
+        self.assertIsNone(kiss.recv_kiss(timeout=2.0))
+        self.assertEqual(kiss.recv_kiss(timeout=2.0), payload)
+
+    def test_peer_close_raises(self):
+        """Test a closed connection is reported rather than read as a timeout."""
+        kiss, peer = self._connect()
+        peer.sendall(bytes([0xC0, 0x00, 0x41, 0xC0]))
+        peer.close()
+        self.assertEqual(kiss.recv_kiss(timeout=2.0), b"\x00A")
+        with self.assertRaises(ConnectionError):
+            kiss.recv_kiss(timeout=2.0)
+
+    def test_send_round_trip(self):
+        """Test frames sent by one transport are received intact by another."""
+        kiss, peer = self._connect(use_checksum=True)
+        frames = [bytes([0x00]) + bytes(range(256)), bytes([0x00, 0xC0, 0xDB])]
+        kiss.send_kiss_many(frames)
+        received = bytearray()
+        while received.count(0xC0) < 2 * len(frames):
+            received += peer.recv(4096)
+        peer.sendall(received)
+        self.assertEqual([kiss.recv_kiss(timeout=2.0) for _ in frames], frames)
+
+class TestAGWTransport(unittest.TestCase):
+    def setUp(self):
+        """Connect an AGWTransport to one end of a socket pair."""
+        self.peer, sock = socket.socketpair()
+        self.agw = AGWTransport(call="N0CALL")
+        self.agw.sock = sock
+
+    def tearDown(self):
+        self.agw.close()
+        self.peer.close()
+
+    def test_recv_reassembles_split_frame(self):
+        """Test header and payload arriving in several segments."""
+        payload = bytes(range(256)) * 8
+        frame = AGWTransport.HEADER.pack(0, ord('D'), 0xF0, b"N1CALL", b"N0CALL", len(payload), 0) + payload
+
+        def feed():
+            for i in range(0, len(frame), 7):
+                self.peer.sendall(frame[i:i + 7])
+
+        writer = threading.Thread(target=feed)
+        writer.start()
+        self.assertEqual(self.agw.recv(), payload)
+        writer.join()
+
+    def test_send_header_layout(self):
+        """Test the data length lands in the 32-bit field at offset 28."""
+        self.agw.send(b"hello")
+        frame = self.peer.recv(64)
+        self.assertEqual(frame[4], ord('D'))
+        self.assertEqual(frame[8:14], b"N0CALL")
+        self.assertEqual(int.from_bytes(frame[28:32], 'little'), 5)
+        self.assertEqual(frame[36:], b"hello")
+
+if __name__ == '__main__':
+    unittest.main()